@@ -0,0 +1,176 @@
+"""Due dates kept locally by node id and a time ordered agenda built from them"""
+import os
+import heapq
+import datetime
+import yaml
+from keepcli.filelock import FileLock, replace_atomic
+
+DUE_FILE = 'due.yaml'
+
+
+class DueStore(object):
+    """
+    Due dates saved in a yaml file, node id -> {due: YYYY-MM-DD, parent: list id or
+    None}, so Keep content is never changed to hold them. The file is read and written
+    under its lock so several keepcli processes can share it.
+
+    Parameters
+    ----------
+    path : str
+        The due dates file, e.g. ~/.keepcli/due.yaml
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r') as stream:
+            return yaml.safe_load(stream) or {}
+
+    def load(self):
+        """
+        Returns
+        -------
+        dict
+            node id -> (datetime.date, parent list id or None)
+        """
+        with FileLock(self.path, shared=True):
+            data = self._read()
+        return dict((node_id, (datetime.datetime.strptime(entry['due'], '%Y-%m-%d').date(),
+                               entry.get('parent')))
+                    for node_id, entry in data.items())
+
+    def set(self, node, due, parent=None):
+        """
+        Sets or removes (when due is None) the due date of a list, note or item
+
+        Parameters
+        ----------
+        node : gkeepapi.node.Node
+            Entry, or item of the list parent
+        due : datetime.date or None
+            New due date
+        parent : gkeepapi.node.List, optional
+            List of the item
+        """
+        with FileLock(self.path):
+            data = self._read()
+            if due is None:
+                data.pop(node.id, None)
+            else:
+                data[node.id] = {'due': due.isoformat(),
+                                 'parent': parent.id if parent is not None else None}
+            replace_atomic(self.path, yaml.safe_dump(
+                data, default_flow_style=False).encode('utf-8'))
+
+
+def parse_date(value, today=None):
+    """
+    Parses a user supplied date: YYYY-MM-DD, today, tomorrow, yesterday, +N or -N (days
+    from today)
+
+    Returns
+    -------
+    datetime.date or None
+        None if the value cannot be parsed
+    """
+    today = today or datetime.date.today()
+    value = value.strip().lower()
+    if value == 'today':
+        return today
+    if value == 'tomorrow':
+        return today + datetime.timedelta(days=1)
+    if value == 'yesterday':
+        return today - datetime.timedelta(days=1)
+    if value[:1] in '+-' and value[1:].rstrip('d').isdigit():
+        days = int(value[1:].rstrip('d'))
+        return today + datetime.timedelta(days=days if value[0] == '+' else -days)
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+class Agenda(object):
+    """
+    Time ordered schedule of the notes, lists and unchecked list items with a due date.
+    Due dates live in a binary heap; a node whose due date changes just pushes a new entry
+    and the old one is skipped lazily, so updates are O(log n) and reading what is due up
+    to a date only visits the heap entries before that date.
+    """
+    def __init__(self):
+        self.heap = []
+        self.due = {}
+        self.owner = {}
+
+    def __len__(self):
+        return len(self.due)
+
+    def _set(self, node, due, parent=None):
+        if self.due.get(node.id) == due:
+            self.owner[node.id] = (node, parent)
+            return
+        if due is None:
+            self.due.pop(node.id, None)
+            self.owner.pop(node.id, None)
+            return
+        self.due[node.id] = due
+        self.owner[node.id] = (node, parent)
+        heapq.heappush(self.heap, (due, node.id))
+
+    def _drop(self, node_id):
+        self.due.pop(node_id, None)
+        self.owner.pop(node_id, None)
+
+    def update(self, entries, due):
+        """
+        Brings the agenda up to date with the given entries and due dates. Nodes are
+        looked up by id, so the cost does not depend on the number of items. Nodes that
+        are gone, trashed, deleted or checked are dropped.
+
+        Parameters
+        ----------
+        entries : list of gkeepapi.node.TopLevelNode
+            All the entries, usually the output of gkeepapi.Keep.all()
+        due : dict
+            node id -> (due date, parent list id or None), as returned by DueStore.load
+        """
+        by_id = dict((n.id, n) for n in entries if not n.trashed)
+        for node_id in set(self.due) - set(due):
+            self._drop(node_id)
+        for node_id, (date, parent_id) in due.items():
+            parent = by_id.get(parent_id) if parent_id is not None else None
+            node = parent.get(node_id) if parent is not None else by_id.get(node_id)
+            if node is None or node.deleted or (parent is not None and node.checked):
+                self._drop(node_id)
+                continue
+            self._set(node, date, parent)
+        if len(self.heap) > 2 * len(self.due) + 16:
+            self.heap = [(d, i) for i, d in self.due.items()]
+            heapq.heapify(self.heap)
+
+    def until(self, limit=None):
+        """
+        Yields (due date, node, parent list) in due order up to and including limit.
+        The heap is walked as a tree from its root so entries after limit are never visited.
+
+        Parameters
+        ----------
+        limit : datetime.date, optional
+            Last due date to include, everything if None
+        """
+        heap = self.heap
+        frontier = [(heap[0], 0)] if heap else []
+        done = set()
+        while frontier:
+            (due, node_id), pos = heapq.heappop(frontier)
+            if limit is not None and due > limit:
+                break
+            if self.due.get(node_id) == due and node_id not in done:
+                done.add(node_id)
+                node, parent = self.owner[node_id]
+                yield due, node, parent
+            for child in (2 * pos + 1, 2 * pos + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
@@ -0,0 +1,205 @@
+"""Asyncio facade that runs blocking gkeepapi calls concurrently on a thread pool"""
+import sys
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+WORKERS = 4
+CANCELLED = 'cancelled'
+FINISHED = 'finished'
+RUNNING = 'running'
+
+
+class Cancelled(Exception):
+    """ Raised in an interrupted node tree call at its next API request"""
+
+
+class AsyncKeep(object):
+    """
+    Wraps a gkeepapi.Keep client so its blocking calls (login, sync, media links, dumps)
+    run on a bounded thread pool and can be awaited, overlapped and cancelled with Ctrl-C.
+    gkeepapi is not thread safe, so anything touching the node tree (sync, dump) is
+    serialized per client while network only calls (media) run in parallel. The HTTP
+    sessions of the client call check_cancelled before every request, so an interrupted
+    sync stops between two API requests.
+
+    Parameters
+    ----------
+    keep : gkeepapi.Keep
+        The default client used when none is given
+    workers : int, optional
+        Maximum number of calls running at the same time
+    """
+    def __init__(self, keep, workers=WORKERS):
+        self.keep = keep
+        self.workers = workers
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.semaphore = None
+        self.locks = {}
+        self.running = {}
+        self.running_lock = threading.Lock()
+        self.local = threading.local()
+        self.interrupted = None
+
+    def lock(self, keep=None):
+        """
+        Returns the lock serializing node tree access for a client, reentrant so a call
+        running under it may take it again
+        """
+        keep = keep or self.keep
+        return self.locks.setdefault(id(keep), threading.RLock())
+
+    async def _submit(self, func, tree):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.workers)
+        async with self.semaphore:
+            if not tree:
+                return await asyncio.wrap_future(self.executor.submit(func), loop=self.loop)
+            cancel = threading.Event()
+            future = self.executor.submit(self._guarded, cancel, func)
+            with self.running_lock:
+                self.running[future] = cancel
+            future.add_done_callback(self._finished)
+            return await asyncio.wrap_future(future, loop=self.loop)
+
+    def _guarded(self, cancel, func):
+        self.local.cancel = cancel
+        try:
+            self.check_cancelled()
+            return func()
+        finally:
+            self.local.cancel = None
+
+    def _finished(self, future):
+        with self.running_lock:
+            self.running.pop(future, None)
+
+    def check_cancelled(self):
+        """
+        Raises Cancelled when called from a node tree call that was interrupted, does
+        nothing anywhere else
+        """
+        cancel = getattr(self.local, 'cancel', None)
+        if cancel is not None and cancel.is_set():
+            raise Cancelled('Interrupted')
+
+    async def call(self, func, *args, **kwargs):
+        """
+        Runs a blocking function on the thread pool, at most `workers` at a time
+        """
+        return await self._submit(functools.partial(func, *args, **kwargs), False)
+
+    def _exclusive(self, keep, func, *args, **kwargs):
+        with self.lock(keep):
+            self.check_cancelled()
+            return func(*args, **kwargs)
+
+    async def exclusive(self, func, *args, keep=None, **kwargs):
+        """
+        Runs a blocking function on the thread pool while holding the client lock. If it
+        is interrupted run() stops it at its next API request and waits for that, since it
+        touches the node tree.
+        """
+        return await self._submit(
+            functools.partial(self._exclusive, keep, func, *args, **kwargs), True)
+
+    async def login(self, user, passwd, keep=None):
+        keep = keep or self.keep
+        return await self.exclusive(keep.login, user, passwd, keep=keep)
+
+    async def sync(self, keep=None, resync=False):
+        keep = keep or self.keep
+        return await self.exclusive(keep.sync, resync, keep=keep)
+
+    async def media_link(self, blob, keep=None):
+        keep = keep or self.keep
+        return await self.call(keep.getMediaLink, blob)
+
+    async def _progress(self, message, task, stream):
+        stream.write(message)
+        stream.flush()
+        while not task.done():
+            await asyncio.sleep(0.5)
+            stream.write('.')
+            stream.flush()
+
+    def run(self, coro, message=None, stream=None):
+        """
+        Drives a coroutine to completion from synchronous code, printing progress dots
+        after message while it runs. Ctrl-C cancels it and raises KeyboardInterrupt once
+        the cancellation went through. Threads cannot be killed: network only calls finish
+        in the background, calls touching the node tree (exclusive) are asked to stop at
+        their next API request and waited for, so the caller does not read the tree while
+        a sync is still using it. A second Ctrl-C stops waiting. What happened is left in
+        `interrupted`: CANCELLED, FINISHED (the calls completed before they could be
+        stopped) or RUNNING (still running in the background after a second Ctrl-C).
+
+        Parameters
+        ----------
+        coro : coroutine
+            What to run, e.g. AsyncKeep.sync()
+        message : str, optional
+            Progress message, no progress is shown if None
+
+        Returns
+        -------
+        The coroutine result
+        """
+        stream = stream or sys.stdout
+        task = asyncio.ensure_future(coro, loop=self.loop)
+        progress = None
+        if message is not None:
+            progress = asyncio.ensure_future(self._progress(message, task, stream),
+                                             loop=self.loop)
+        self.interrupted = None
+        try:
+            return self.loop.run_until_complete(task)
+        except KeyboardInterrupt:
+            with self.running_lock:
+                calls = dict(self.running)
+            for cancel in calls.values():
+                cancel.set()
+            task.cancel()
+            try:
+                self.loop.run_until_complete(task)
+            except (asyncio.CancelledError, Exception):
+                pass
+            self.interrupted = self.stop_tree(calls)
+            raise
+        finally:
+            if progress is not None:
+                progress.cancel()
+                try:
+                    self.loop.run_until_complete(progress)
+                except asyncio.CancelledError:
+                    pass
+                stream.write('\n')
+
+    def stop_tree(self, calls):
+        """
+        Waits for interrupted node tree calls (future -> cancel event), a second Ctrl-C
+        stops waiting
+
+        Returns
+        -------
+        str
+            CANCELLED if one of them stopped early (or none was running), FINISHED if they
+            all completed anyway, RUNNING if they were left running
+        """
+        try:
+            wait(list(calls))
+        except KeyboardInterrupt:
+            return RUNNING
+        for future in calls:
+            if future.cancelled() or isinstance(future.exception(), Cancelled):
+                return CANCELLED
+        return FINISHED if calls else CANCELLED
+
+    def close(self):
+        """
+        Stops accepting work, running calls are left to finish in the background
+        """
+        self.executor.shutdown(wait=False)
+        self.loop.close()
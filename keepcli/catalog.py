@@ -0,0 +1,82 @@
+"""Plain text catalog of titles, lists and items used by the shell completion script.
+It is written on every refresh so shell TAB completion never needs gkeepapi or the network"""
+import os
+import hashlib
+from keepcli.filelock import write_locked
+
+CATALOG_FILE = 'catalog.tsv'
+
+
+def clean(text):
+    """ Tabs and new lines are the catalog separators"""
+    return ' '.join(text.split())
+
+
+def build_catalog(lists, notes, labels, commands, options, current=None):
+    """
+    Builds the catalog text, one <kind>TAB<scope>TAB<value> record per line
+
+    Parameters
+    ----------
+    lists : list of gkeepapi.node.List
+        Active lists, their unchecked items are included with the list title as scope
+    notes : list of gkeepapi.node.Note
+        Active notes
+    labels : list of str
+        Label names
+    commands : list of str
+        Command names available in the shell
+    options : dict
+        Static options per command, e.g. {'entries': ['all', 'notes', 'lists']}
+    current : str, optional
+        Title of the current list/note, written as the scope its items are found under
+
+    Returns
+    -------
+    str
+        The catalog content
+    """
+    lines = []
+    for name in commands:
+        lines.append('command\t\t{}'.format(name))
+    for name, values in options.items():
+        for value in values:
+            lines.append('option\t{}\t{}'.format(name, value))
+    if current is not None:
+        lines.append('current\t\t{}'.format(clean(current)))
+    for n in lists:
+        lines.append('list\t\t{}'.format(clean(n.title)))
+    for n in notes:
+        lines.append('note\t\t{}'.format(clean(n.title)))
+    for name in labels:
+        lines.append('label\t\t{}'.format(clean(name)))
+    for n in lists:
+        title = clean(n.title)
+        for item in n.unchecked:
+            lines.append('item\t{}\t{}'.format(title, clean(item.text)))
+    return '\n'.join(lines) + '\n'
+
+
+def write_catalog(path, text, digest=None):
+    """
+    Atomically writes the catalog under its lock unless its content did not change
+
+    Parameters
+    ----------
+    path : str
+        Catalog file
+    text : str
+        Catalog content from build_catalog
+    digest : str, optional
+        Digest of the content written last time
+
+    Returns
+    -------
+    str
+        Digest of the content now on disk
+    """
+    new_digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+    if new_digest == digest and os.path.exists(path):
+        return digest
+    write_locked(path, text.encode('utf-8'))
+    return new_digest
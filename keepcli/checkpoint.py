@@ -0,0 +1,86 @@
+"""Background, rate limited and atomic checkpoints of the offline snapshot"""
+import time
+import pickle
+import threading
+from keepcli.filelock import write_locked
+
+
+class Checkpointer(object):
+    """
+    Keeps the offline snapshot (<user>.kci) recent. Changes mark it dirty; once the
+    session has been idle for `idle` seconds it is pickled and written on a background
+    thread, at most once every `interval` seconds, and a last time on exit.
+
+    The command lock is held by the shell while a command runs, so the node tree is
+    never pickled while it is being modified; an idle checkpoint that finds it busy
+    just waits for the next idle period.
+
+    Parameters
+    ----------
+    get_keep : callable
+        Returns the gkeepapi.Keep to snapshot
+    get_path : callable
+        Returns the snapshot file, or None if it is not known yet
+    interval : float, optional
+        Minimum seconds between two background checkpoints
+    idle : float, optional
+        Seconds without commands before a checkpoint is written
+    """
+    def __init__(self, get_keep, get_path, interval=60, idle=5):
+        self.get_keep = get_keep
+        self.get_path = get_path
+        self.interval = interval
+        self.idle = idle
+        self.lock = threading.RLock()
+        self.dirty = False
+        self.last = 0
+        self.timer = None
+        self.enabled = True
+
+    def touch(self):
+        """ Marks the snapshot as out of date"""
+        self.dirty = True
+
+    def schedule(self):
+        """ Called after every command, (re)starts the idle countdown"""
+        if self.timer is not None:
+            self.timer.cancel()
+        if not self.enabled or not self.dirty:
+            return
+        delay = max(self.idle, self.last + self.interval - time.time())
+        self.timer = threading.Timer(delay, self._idle)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _idle(self):
+        if not self.lock.acquire(False):
+            return
+        try:
+            self.write()
+        except (IOError, OSError, pickle.PicklingError):
+            pass
+        finally:
+            self.lock.release()
+
+    def write(self):
+        """
+        Writes the snapshot now, the caller must make sure the tree is not being modified.
+        Returns the snapshot file, None if there was nothing to write to. The snapshot
+        stays dirty if the write fails, so it is tried again.
+        """
+        path = self.get_path()
+        if path is None:
+            return None
+        data = pickle.dumps(self.get_keep())
+        write_locked(path, data)
+        self.dirty = False
+        self.last = time.time()
+        return path
+
+    def close(self):
+        """ Stops the idle countdown and writes a pending checkpoint"""
+        if self.timer is not None:
+            self.timer.cancel()
+        if self.enabled and self.dirty:
+            with self.lock:
+                self.write()
@@ -0,0 +1,106 @@
+"""Shared/exclusive file locks so several keepcli processes can share config and snapshots"""
+import os
+import mmap
+import pickle
+import yaml
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class FileLock(object):
+    """
+    Advisory lock for a file, many shared holders or a single exclusive one. The lock is
+    taken on a <path>.lock side file because files are replaced atomically (a new inode)
+    on every write. Without fcntl (Windows) it does nothing.
+
+    Parameters
+    ----------
+    path : str
+        File to protect
+    shared : bool, optional
+        Take a shared (reader) lock instead of an exclusive (writer) one
+    """
+    def __init__(self, path, shared=False):
+        self.path = path + '.lock'
+        self.shared = shared
+        self.fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(self.fd, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+
+def replace_atomic(path, data):
+    """
+    Writes bytes to path through a temporary file and a rename, readers see either the
+    old or the new content. The caller holds the exclusive lock.
+    """
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as new:
+        new.write(data)
+        new.flush()
+        os.fsync(new.fileno())
+    os.replace(tmp, path)
+
+
+def write_locked(path, data):
+    """ Atomically replaces path with data under the exclusive lock"""
+    with FileLock(path):
+        replace_atomic(path, data)
+
+
+def read_yaml(path):
+    """ Reads a yaml file under a shared lock"""
+    with FileLock(path, shared=True):
+        with open(path, 'r') as stream:
+            return yaml.safe_load(stream)
+
+
+def write_yaml(path, data):
+    """ Atomically replaces a yaml file under the exclusive lock"""
+    text = yaml.safe_dump(data, default_flow_style=False)
+    write_locked(path, text.encode('utf-8'))
+
+
+def update_yaml(path, changes):
+    """
+    Read-modify-write of a yaml mapping under the exclusive lock: only the given keys are
+    changed, so processes writing different keys do not undo each other
+
+    Returns
+    -------
+    dict
+        The content now on disk
+    """
+    with FileLock(path):
+        current = {}
+        if os.path.exists(path):
+            with open(path, 'r') as stream:
+                current = yaml.safe_load(stream) or {}
+        current.update(changes)
+        replace_atomic(path, yaml.safe_dump(current, default_flow_style=False).encode('utf-8'))
+    return current
+
+
+def read_snapshot(path):
+    """
+    Loads a pickled snapshot under a shared lock. The file is memory-mapped read-only so
+    it is not copied into a buffer before unpickling.
+    """
+    with FileLock(path, shared=True):
+        with open(path, 'rb') as snapshot:
+            if os.fstat(snapshot.fileno()).st_size == 0:
+                raise IOError('{} is empty'.format(path))
+            with mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return pickle.loads(data)
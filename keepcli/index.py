@@ -0,0 +1,195 @@
+"""Precomputed indexes over Keep entries used to filter them without rescanning"""
+import bisect
+
+
+def iter_bits(mask):
+    """
+    Yields the positions of the set bits of an integer, lowest first
+
+    Parameters
+    ----------
+    mask : int
+        Bitset to walk
+
+    Yields
+    ------
+    int
+        Position of every set bit
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class EntryIndex(object):
+    """
+    Bitset index over the top level Keep entries. Every entry gets a position and each
+    filterable attribute keeps an integer whose bits mark the entries that match it, so a
+    query is a few integer ANDs followed by a walk over the matching positions only.
+    Entries are also sorted by last update, once after the build, so age queries are a
+    binary search.
+
+    Parameters
+    ----------
+    entries : list of gkeepapi.node.TopLevelNode
+        Entries to index, usually the output of gkeepapi.Keep.all()
+    """
+    def __init__(self, entries=()):
+        self.nodes = []
+        self.all = 0
+        self.pinned = 0
+        self.archived = 0
+        self.trashed = 0
+        self.updated = []
+        self.updated_sorted = True
+        self.types = {}
+        self.colors = {}
+        self.labels = {}
+        self.label_positions = {}
+        for node in entries:
+            self.add(node)
+        self.sort_updated()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add(self, node):
+        """
+        Adds a single entry to the index
+
+        Parameters
+        ----------
+        node : gkeepapi.node.TopLevelNode
+            The entry to index
+        """
+        position = len(self.nodes)
+        bit = 1 << position
+        self.nodes.append(node)
+        self.all |= bit
+        if node.pinned:
+            self.pinned |= bit
+        if node.archived:
+            self.archived |= bit
+        if node.trashed:
+            self.trashed |= bit
+        self.updated.append((node.timestamps.updated, position))
+        self.updated_sorted = False
+        type_name = node.type.name
+        self.types[type_name] = self.types.get(type_name, 0) | bit
+        color = node.color.name.lower()
+        self.colors[color] = self.colors.get(color, 0) | bit
+        for label in node.labels.all():
+            self.labels[label.name] = self.labels.get(label.name, 0) | bit
+            self.label_positions.setdefault(label.name, []).append(position)
+
+    def sort_updated(self):
+        if not self.updated_sorted:
+            self.updated.sort()
+            self.updated_sorted = True
+
+    def updated_before(self, cutoff):
+        """
+        Bitset of the entries last updated before cutoff (a datetime)
+        """
+        self.sort_updated()
+        mask = 0
+        for _, position in self.updated[:bisect.bisect_left(self.updated, (cutoff,))]:
+            mask |= 1 << position
+        return mask
+
+    def mask(self, pinned=None, archived=None, trashed=None, type=None, color=None, label=None,
+             updated_before=None):
+        """
+        Computes the bitset of entries matching all the given predicates. A predicate set
+        to None is ignored.
+
+        Parameters
+        ----------
+        pinned, archived, trashed : bool, optional
+            Required state of the corresponding flag
+        type : str, optional
+            Node type name, 'Note' or 'List'
+        color : str, optional
+            Lower case gkeepapi color name, e.g. 'red'
+        label : str, optional
+            Label name
+        updated_before : datetime.datetime, optional
+            Entries last updated before this time
+
+        Returns
+        -------
+        int
+            Bitset of matching positions
+        """
+        mask = self.all
+        for flag, value in ((self.pinned, pinned), (self.archived, archived),
+                            (self.trashed, trashed)):
+            if value is None:
+                continue
+            mask &= flag if value else ~flag
+        if type is not None:
+            mask &= self.types.get(type, 0)
+        if color is not None:
+            mask &= self.colors.get(color, 0)
+        if label is not None:
+            mask &= self.labels.get(label, 0)
+        if updated_before is not None:
+            mask &= self.updated_before(updated_before)
+        return mask
+
+    def select(self, **predicates):
+        """
+        Returns the entries matching all the given predicates, in index order.
+        See mask() for the accepted keywords. When a label is given only the entries
+        carrying that label are visited.
+        """
+        nodes = self.nodes
+        mask = self.mask(**predicates)
+        label = predicates.get('label')
+        if label is not None:
+            return [nodes[i] for i in self.label_positions.get(label, []) if mask >> i & 1]
+        return [nodes[i] for i in iter_bits(mask)]
+
+    def count(self, **predicates):
+        """
+        Returns the number of entries matching all the given predicates
+        """
+        return bin(self.mask(**predicates)).count('1')
+
+
+def normalize(text):
+    """
+    Normalized form of an item text used to find duplicates: case and spacing are
+    ignored
+    """
+    return ' '.join(text.lower().split())
+
+
+class ItemIndex(object):
+    """
+    Hash index of all list items by normalized text, built in a single pass so
+    duplicates across lists are found without comparing items pairwise
+
+    Parameters
+    ----------
+    lists : list of gkeepapi.node.List
+        Lists to index, trashed lists should be left out
+    """
+    def __init__(self, lists=()):
+        self.by_text = {}
+        for List in lists:
+            for item in List.items:
+                self.by_text.setdefault(normalize(item.text), []).append((List, item))
+
+    def find(self, text):
+        """
+        Returns the (list, item) pairs whose text matches text once normalized
+        """
+        return self.by_text.get(normalize(text), [])
+
+    def duplicates(self):
+        """
+        Returns the groups of (list, item) pairs sharing the same normalized text
+        """
+        return [group for group in self.by_text.values() if len(group) > 1]
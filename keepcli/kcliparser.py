@@ -1,7 +1,10 @@
 import argparse
+import os
 import sys
 from .version import __version__
 
+completion_file = os.path.join(os.path.dirname(__file__), 'keepcli-completion.bash')
+
 
 class MyParser(argparse.ArgumentParser):
     def error(self, message):
@@ -19,10 +22,20 @@ def get_args():
                         help="print version number and exit")
     parser.add_argument("-o", "--offline", action="store_true",
                         help="Run in offline mode (need to dump the data in advance)")
+    parser.add_argument("-c", "--command", action="append", default=None,
+                        help="Run a keepcli command and exit (can be repeated)")
+    parser.add_argument("--completion", action="store_true",
+                        help="print the bash/zsh completion script and exit. "
+                             "Use: eval \"$(keepcli --completion)\"")
     args = parser.parse_args()
 
     if args.version:
         print('\nCurrent version: {}'.format(__version__))
         sys.exit()
 
+    if args.completion:
+        with open(completion_file) as script:
+            print(script.read())
+        sys.exit()
+
     return args
@@ -1,12 +1,37 @@
 import cmd
 import sys
+import atexit
+import signal
 import os
 import getpass
-import pickle
+import shlex
+import subprocess
+import tempfile
 import argparse
+import datetime
+import json
+import time
+import shutil
 import gkeepapi
+import requests
 import yaml
 import keepcli.kcliparser as kcliparser
+from keepcli.index import EntryIndex, ItemIndex
+from keepcli.agenda import DUE_FILE, Agenda, DueStore, parse_date
+from keepcli.tree import TreeCache
+from keepcli.aiokeep import FINISHED, RUNNING, AsyncKeep, Cancelled
+from keepcli.catalog import CATALOG_FILE, build_catalog, write_catalog
+from keepcli.mirror import MIRROR_FILE, Mirror, digest, render
+from keepcli.mirror import apply_list, parse_list, parse_note
+from keepcli.media import MEDIA_DIR, MediaCache, describe, fetch_blobs
+from keepcli.stats import Stats
+from keepcli.checkpoint import Checkpointer
+from keepcli.scheduler import SyncScheduler
+from keepcli.netstats import NetStats, pool_keep
+from keepcli.template import TEMPLATE_FILE, TemplateStore, instantiate
+from keepcli.metrics import METRICS_FILE, MetricsWriter, keepcli_metrics
+from keepcli.replay import from_environment
+from keepcli.filelock import FileLock, read_snapshot, read_yaml, update_yaml, write_yaml
 from keepcli.version import __version__
 
 try:
@@ -51,15 +76,43 @@ colorsGK = {
 }
 
 options_entries = ['all', 'notes', 'lists']
+options_entries_flags = ['show', 'pinned', 'archived', 'color', 'label']
 options_commands = ['note', 'list']
 options_current = ['show', 'color', 'pin', 'unpin']
 options_config = ['set']
+options_label = ['add', 'remove', 'list']
+options_agenda = ['today', 'week', 'all']
+options_mirror = ['sync', 'add', 'remove', 'list', 'dir']
+options_media = ['list', 'fetch', 'open', 'clear']
+options_netstats = ['reset', '--json']
+options_template = ['save', 'apply', 'list', 'remove']
+options_show = ['limit', 'offset', 'unchecked-only', 'since', 'pager']
+options_cleanup = ['--older-than', '--done', '--trashed', '--archive', '--delete',
+                   '--purge-checked', '--dry-run']
+options_catalog = {
+    'entries': options_entries + ['--' + flag for flag in options_entries_flags],
+    'create': options_commands,
+    'current': options_current,
+    'config': options_config,
+    'label': options_label,
+    'agenda': options_agenda,
+    'mirror': options_mirror,
+    'media': options_media,
+    'netstats': options_netstats,
+    'template': options_template,
+    'cleanup': options_cleanup,
+    'color': list(colors.keys()),
+}
 true_options = ['true', 'yes', '1', 'y', 't']
 
+list_trees = TreeCache()
+
 
-def print_list(List, mode, only_unchecked=False):
+def print_list(List, mode, only_unchecked=False, offset=0, limit=None, since=None,
+               header=True):
     """
-    Prints out checked followed by unchecked items from a list sorted by time of creation
+    Prints out unchecked followed by checked items from a list sorted by time of creation,
+    with sub-items indented under their parent item
 
     Parameters
     ----------
@@ -67,24 +120,36 @@ def print_list(List, mode, only_unchecked=False):
            The input list class
     mode : int
            mode to be used by colored to whether (mode=1) or not mode=0) use termcolor
+    only_unchecked : bool, optional
+           If True checked items (and their sub-items) are not printed
+    offset, limit : int, optional
+           Window of rows to print, only those rows are formatted
+    since : datetime.date, optional
+           Only items updated on or after this day
+    header : bool, optional
+           Whether to print the item counts first
+
+    Returns
+    -------
+    int
+        Number of rows selected, before the window is applied
     """
     try:
-        times_unchecked = [item.timestamps.created for item in List.unchecked]
+        tree = list_trees.get(List)
     except:
         print('List printing is not supported without sync, please sync your data')
-        return
-
-    unchecked = [x for _, x in
-                 sorted(zip(times_unchecked, List.unchecked), key=lambda pair: pair[0])]
-    times_checked = [item.timestamps.created for item in List.checked]
-    checked = [x for _, x in sorted(zip(times_checked, List.checked), key=lambda pair: pair[0])]
-    print('Unchecked items: {} out of {}'.format(len(unchecked), len(checked)+len(unchecked)))
-    for i in unchecked:
-        print(colored(i, "red", mode))
-    if only_unchecked:
-        return
-    for i in checked:
-        print(colored(i, "green", mode))
+        return 0
+    if since is None:
+        rows = tree.rows(only_unchecked)
+    else:
+        rows = tree.rows_since(since, only_unchecked)
+    if header:
+        print('Unchecked items: {} out of {}'.format(tree.unchecked, tree.total))
+    end = len(rows) if limit is None else offset + limit
+    for depth, i in rows[offset:end]:
+        line = '{}{} {}'.format('  ' * depth, u'\u2611' if i.checked else u'\u2610', i.text)
+        print(colored(line, "green" if i.checked else "red", mode))
+    return len(rows)
 
 
 def get_color(entry, mode, color_only=False):
@@ -127,16 +192,40 @@ class GKeep(cmd.Cmd):
         self.auth_file = auth_file
         self.conf_file = conf_file
         self.current = None
-        self.update_config()
+        self.username = None
+        self.agenda = Agenda()
+        self.stats = Stats()
+        self.catalog_digest = None
+        self.metrics = keepcli_metrics()
+        self.metrics_writer = None
         self.kcli_path = os.path.dirname(self.auth_file)
+        self.update_config()
+        self.mirror = Mirror(os.path.join(self.kcli_path, MIRROR_FILE),
+                             os.path.join(self.kcli_path, 'mirror'))
+        self.media = MediaCache(os.path.join(self.kcli_path, MEDIA_DIR))
+        self.templates = TemplateStore(os.path.join(self.kcli_path, TEMPLATE_FILE))
+        self.due_dates = DueStore(os.path.join(self.kcli_path, DUE_FILE))
+        self.checkpoint = Checkpointer(lambda: self.keep, self.snapshot_file)
+        self.checkpoint.enabled = self.conf['checkpoint']
         if self.offline:
             self.autosync = False
         self.prompt = 'keepcli [] ~> '
         self.keep = gkeepapi.Keep()
+        self.aio = AsyncKeep(self.keep)
+        self.netstats = NetStats()
+        pool_keep(self.keep, self.netstats, check=self.aio.check_cancelled)
+        self.replay = from_environment()
+        if self.replay is not None:
+            self.replay.attach(self.keep)
+        self.scheduler = SyncScheduler(self.sync_keep, self.pending_changes)
+        self.closed = False
+        replay_user = getattr(self.replay, 'user', None)
         if not self.offline:
             try:
-                with open(auth_file, 'r') as auth:
-                    conn = yaml.load(auth)
+                if replay_user is not None:
+                    conn = {'user': replay_user, 'passwd': ''}
+                else:
+                    conn = read_yaml(auth_file)
             except FileNotFoundError:
                 conn = {}
                 print('\nAuth file {} not found, will create one... '
@@ -145,19 +234,26 @@ class GKeep(cmd.Cmd):
                 conn['passwd'] = getpass.getpass(prompt='Enter password : ')
             print('\nLogging {} in...\n'.format(colored(conn['user'], 'green', self.termcolor)))
             try:
-                self.connect = self.keep.login(conn['user'], conn['passwd'])
-                with open(auth_file, 'w') as auth:
-                    yaml.dump(conn, auth, default_flow_style=False)
-                self.username = conn['user']
+                self.connect = self.aio.run(self.aio.login(conn['user'], conn['passwd']))
             except (gkeepapi.exception.LoginException, ValueError) as e:
                 if e.__class__.__name__ == 'ValueError':
                     print("\n Can't login and sync from empty content, please create a note online")
                 else:
                     print('\nUser/Password not valid (auth file : {})\n'.format(auth_file))
                 sys.exit(1)
+            except KeyboardInterrupt:
+                # a login that completed before it could be stopped is kept
+                if self.aio.interrupted != FINISHED:
+                    print('\nLogin cancelled\n')
+                    sys.exit(1)
+                self.connect = None
+            if replay_user is None:
+                write_yaml(auth_file, conn)
+            self.username = conn['user']
             self.do_refresh(None, force_sync=True)
         else:
             print(colored('\nRunning Offline\n', "red", self.termcolor))
+            self.do_load(None)
         self.complete_ul = self.complete_useList
         self.complete_un = self.complete_useNote
         self.do_useNote(self.conf['current'])
@@ -166,13 +262,120 @@ class GKeep(cmd.Cmd):
                           ' *Other Commands*', "cyan", self.termcolor) + ' (type help <command>):'
         self.keep_header = colored(
                           ' *Keep Commands*', "cyan", self.termcolor) + ' (type help <command>):'
+        atexit.register(self.shutdown)
 
     def update_config(self):
         """ Update config parameters into current session"""
-        with open(self.conf_file, 'r') as confile:
-            self.conf = yaml.load(confile)
+        self.conf = read_yaml(self.conf_file)
         self.termcolor = 1 if self.conf['termcolor'] else 0
         self.autosync = True if self.conf['autosync'] else False
+        self.adaptive = True if self.conf['adaptive_sync'] else False
+        self.set_metrics(self.conf['metrics'])
+        try:
+            self.checkpoint.enabled = self.conf['checkpoint']
+        except AttributeError:
+            pass
+
+    def set_metrics(self, enabled):
+        """
+        Starts or stops the metrics textfile writer, the file is KEEPCLI_METRICS or
+        ~/.keepcli/keepcli.prom
+        """
+        if enabled and self.metrics_writer is None:
+            path = os.environ.get('KEEPCLI_METRICS', os.path.join(self.kcli_path, METRICS_FILE))
+            self.metrics_writer = MetricsWriter(self.metrics, path)
+            self.metrics_writer.start()
+        elif not enabled and self.metrics_writer is not None:
+            self.metrics_writer.close()
+            self.metrics_writer = None
+
+    def snapshot_file(self):
+        """ Offline snapshot of the current user, None if the user is not known yet"""
+        if self.username is None:
+            return None
+        return os.path.join(self.kcli_path, self.username+'.kci')
+
+    def onecmd(self, line):
+        """
+        Runs a command holding the checkpoint lock, then restarts the idle checkpoint and
+        background sync countdowns
+        """
+        command = self.parseline(line)[0] or 'empty'
+        if not hasattr(self, 'do_' + command):
+            command = 'invalid'
+        with self.checkpoint.lock:
+            with self.metrics.timer('keepcli_command_duration_seconds', command=command):
+                stop = cmd.Cmd.onecmd(self, line)
+        self.checkpoint.schedule()
+        if not stop and self.background_sync_enabled():
+            self.scheduler.schedule(self.background_sync)
+        return stop
+
+    def complete(self, text, state):
+        """
+        Completion reads the titles and item names rebuilt by background syncs, so it
+        holds the command lock as well
+        """
+        with self.checkpoint.lock:
+            return cmd.Cmd.complete(self, text, state)
+
+    def background_sync_enabled(self):
+        return not self.offline and self.autosync and self.adaptive
+
+    def pending_changes(self):
+        """ Whether local changes are waiting to be synced"""
+        return (any(node.dirty for node in self.keep.all()) or
+                any(label.dirty for label in self.keep.labels()))
+
+    def sync_state(self):
+        """
+        What tells whether a sync brought changes: the server version when gkeepapi keeps
+        one, else the number of entries and their latest update
+        """
+        version = getattr(self.keep, '_keep_version', None)
+        if version is not None:
+            return version
+        entries = self.keep.all()
+        return len(entries), max([n.timestamps.updated for n in entries] or [None])
+
+    def sync_keep(self):
+        """ One blocking sync, returns True if the server sent changes"""
+        with self.aio.lock():
+            before = self.sync_state()
+            try:
+                with self.metrics.timer('keepcli_sync_duration_seconds'):
+                    self.keep.sync()
+            except Cancelled:
+                raise
+            except Exception:
+                self.metrics.inc('keepcli_sync_failures_total')
+                raise
+            return self.sync_state() != before
+
+    def background_sync(self):
+        """
+        Timer job, syncs while the shell is idle and quietly rebuilds the indexes. If a
+        command or a completion is running it is skipped, the command restarts the
+        countdown when done. Nothing is printed over the prompt: errors are kept in
+        scheduler.last_error and the sync is retried later.
+        """
+        if self.closed or not self.checkpoint.lock.acquire(False):
+            return
+        try:
+            if self.scheduler.run(retries=0):
+                self.checkpoint.touch()
+            self.rebuild()
+            if self.current is not None and self.current.type.name == 'List':
+                self.set_current_items(self.current)
+        except Exception as e:
+            # a failed sync may have applied part of the server changes
+            self.checkpoint.touch()
+            self.scheduler.last_error = e
+        finally:
+            self.checkpoint.lock.release()
+        self.checkpoint.schedule()
+        if self.background_sync_enabled():
+            self.scheduler.schedule(self.background_sync)
 
     def default(self, arg):
         print()
@@ -281,7 +484,12 @@ class GKeep(cmd.Cmd):
 
     def do_refresh(self, arg, force_sync=False):
         """
-        Sync and Refresh content from Google Keep
+        Sync and Refresh content from Google Keep, Ctrl-C stops a sync in progress before
+        its next request to Keep, a second Ctrl-C leaves it running in the background.
+        A refresh right after a sync with nothing new to send does not sync again.
+        With adaptive_sync on (off by default), changes are synced in the background a few
+        seconds after the last edit, and on any exit, and the server is polled less often
+        the fewer changes it has.
 
         Usage:
             ~> refresh
@@ -289,27 +497,82 @@ class GKeep(cmd.Cmd):
         sync = True if self.autosync else False
         if force_sync:
             sync = True
+        # commands call refresh(None) after local edits, the snapshot is out of date then
+        changed = arg is None and not force_sync
         if not self.offline:
-            if sync:
-                print('Syncing...')
-                self.keep.sync()
+            if arg is None and not force_sync and self.background_sync_enabled():
+                self.scheduler.activity()
+            elif sync:
+                try:
+                    request = self.scheduler.run if force_sync else self.scheduler.request
+                    changed = self.aio.run(self.aio.exclusive(request), 'Syncing...') or changed
+                except KeyboardInterrupt:
+                    # an interrupted sync may have applied part of the server changes
+                    self.checkpoint.touch()
+                    if self.aio.interrupted == RUNNING:
+                        print(colored('Sync still running in the background, refresh again '
+                                      'once it is done', 'red', self.termcolor))
+                        return
+                    if self.aio.interrupted == FINISHED:
+                        print(colored('Sync finished before it could be cancelled',
+                                      'red', self.termcolor))
+                    else:
+                        print(colored('Sync cancelled, showing local content',
+                                      'red', self.termcolor))
+                except (gkeepapi.exception.KeepException, gkeepapi.exception.APIException,
+                        requests.exceptions.RequestException) as e:
+                    changed = True
+                    print(colored('Sync failed ({}), showing local content'.format(e),
+                                  'red', self.termcolor))
         else:
             print(colored('Cannot sync while offline', 'red', self.termcolor))
+        if changed:
+            self.checkpoint.touch()
+        self.rebuild()
+
+    def rebuild(self):
+        """ Rebuilds the indexes, statistics and completion catalog from the local tree"""
+        start = time.time()
         self.entries = self.keep.all()
+        self.index = EntryIndex(self.entries)
+        self.label_names = sorted(label.name for label in self.keep.labels())
+        self.agenda.update(self.entries, self.due_dates.load())
         self.titles = []
         self.lists = []
         self.notes = []
         self.lists_obj = []
         self.notes_obj = []
-        for n in self.entries:
-            if not n.trashed:
-                self.titles.append(n.title)
-                if n.type.name == 'List':
-                    self.lists.append(n.title)
-                    self.lists_obj.append(n)
-                if n.type.name == 'Note':
-                    self.notes.append(n.title)
-                    self.notes_obj.append(n)
+        for n in self.index.select(trashed=False):
+            self.titles.append(n.title)
+            if n.type.name == 'List':
+                self.lists.append(n.title)
+                self.lists_obj.append(n)
+            if n.type.name == 'Note':
+                self.notes.append(n.title)
+                self.notes_obj.append(n)
+        self.item_index = ItemIndex(self.lists_obj)
+        self.stats.update(self.lists_obj, self.notes_obj)
+        self.update_catalog()
+        self.metrics.observe('keepcli_refresh_rebuild_seconds', time.time() - start)
+        account = self.username or ''
+        self.metrics.set('keepcli_entries', len(self.titles), account=account)
+        self.metrics.set('keepcli_items', self.stats.items, account=account)
+        if self.metrics_writer is not None:
+            # dirty walks the whole entry, only worth it when the metrics are written
+            self.metrics.set('keepcli_pending_writes',
+                             sum(1 for node in self.entries if node.dirty))
+
+    def update_catalog(self):
+        """ Writes the shell completion catalog, skipped when nothing changed"""
+        commands = [name[3:] for name in self.get_names() if name.startswith('do_')]
+        text = build_catalog(self.lists_obj, self.notes_obj, self.label_names,
+                             sorted(set(commands)), options_catalog,
+                             self.current.title if self.current is not None else None)
+        try:
+            self.catalog_digest = write_catalog(os.path.join(self.kcli_path, CATALOG_FILE),
+                                                text, self.catalog_digest)
+        except (IOError, OSError):
+            pass
 
     def do_sync(self, arg):
         """
@@ -328,13 +591,78 @@ class GKeep(cmd.Cmd):
             ~> whoami
         """
         print()
-        allitem = sum([len(n.items) for n in self.lists_obj])
-        uncheck = sum([len(n.unchecked) for n in self.lists_obj])
         print('User         : {}'.format(self.username))
         print('Entries      : {} Notes and {} Lists'.format(len(self.notes), len(self.lists)))
-        print('Uncheck Items: {} out of {}'.format(uncheck, allitem))
+        print('Uncheck Items: {} out of {}'.format(self.stats.items - self.stats.checked,
+                                                  self.stats.items))
         print()
 
+    def do_stats(self, arg):
+        """
+        Print statistics about lists and items: totals per list, color and label, checked
+        ratios and items created/completed per day (last update of checked items)
+
+        Usage:
+            ~> stats          : Prints statistics
+            ~> stats --json   : Prints statistics as json
+        """
+        data = self.stats.as_dict()
+        if '--json' in arg:
+            print(json.dumps(data, sort_keys=True))
+            return
+        print()
+        print('Lists: {lists}  Notes: {notes}  Items: {items}  Checked: {checked} '
+              '({checked_ratio:.0%})'.format(**data))
+        for title, key in [('Per list', 'per_list'), ('Per color', 'per_color'),
+                           ('Per label', 'per_label')]:
+            if not data[key]:
+                continue
+            print(colored('\n{}:'.format(title), 'cyan', self.termcolor))
+            for name, counts in sorted(data[key].items()):
+                print('  {: <30} {: >5} items {: >5} checked ({:.0%})'.format(
+                      name, counts['items'], counts['checked'], counts['checked_ratio']))
+        print(colored('\nLast 7 days:', 'cyan', self.termcolor))
+        today = datetime.date.today()
+        for days in range(6, -1, -1):
+            day = (today - datetime.timedelta(days=days)).isoformat()
+            print('  {}  {: >4} created {: >4} completed'.format(
+                  day, data['created_per_day'].get(day, 0), data['completed_per_day'].get(day, 0)))
+        print()
+
+    def do_netstats(self, arg):
+        """
+        Print HTTP traffic to Google Keep per endpoint since start or the last reset:
+        requests, errors, connection retries, bytes received and time spent
+
+        Usage:
+            ~> netstats          : Prints network statistics
+            ~> netstats --json   : Prints network statistics as json
+            ~> netstats reset    : Starts counting again, e.g. to measure a single refresh
+        """
+        if arg.strip() == 'reset':
+            self.netstats.reset()
+            return
+        data = self.netstats.as_dict()
+        if '--json' in arg:
+            print(json.dumps(data, sort_keys=True))
+            return
+        print()
+        print('Since {}'.format(
+              datetime.datetime.fromtimestamp(self.netstats.since).strftime('%Y-%m-%d %H:%M:%S')))
+        if not data:
+            print('No requests\n')
+            return
+        print(colored('{: <40} {: >5} {: >5} {: >5} {: >9} {: >8} {: >8}'.format(
+              'Endpoint', 'Reqs', 'Errs', 'Retry', 'KB', 'Avg ms', 'Max ms'), 'cyan', self.termcolor))
+        for name, entry in sorted(data.items()):
+            print('{: <40} {: >5} {: >5} {: >5} {: >9.1f} {: >8.0f} {: >8.0f}'.format(
+                  name[:40], entry['requests'], entry['errors'], entry['retries'],
+                  entry['bytes'] / 1024.0, entry['avg'] * 1000, entry['max'] * 1000))
+        print()
+
+    def complete_netstats(self, text, line, start_index, end_index):
+        return [option for option in options_netstats if option.startswith(text)]
+
     def do_cs(self, arg):
         self.do_current('show')
 
@@ -360,10 +688,35 @@ class GKeep(cmd.Cmd):
         """
         Exit the program
         """
-        with open(self.conf_file, 'w') as conf:
-            yaml.dump(self.conf, conf, default_flow_style=False)
+        self.shutdown()
         return True
 
+    def do_EOF(self, arg):
+        """
+        Exit the program with Ctrl-D
+        """
+        print()
+        return self.do_exit(arg)
+
+    def shutdown(self):
+        """
+        Saves the session: current entry, edits not synced yet, snapshot, metrics and
+        recording. Runs once, from exit or at interpreter exit for any other way out.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        update_yaml(self.conf_file, {'current': self.conf['current']})
+        self.scheduler.stop()
+        with self.checkpoint.lock:
+            if self.background_sync_enabled() and self.pending_changes():
+                self.do_refresh(None, force_sync=True)
+        self.checkpoint.close()
+        self.set_metrics(False)
+        if self.replay is not None:
+            self.replay.close()
+        self.aio.close()
+
     def do_config(self, arg):
         """
         Print and set configuration options
@@ -396,10 +749,10 @@ class GKeep(cmd.Cmd):
                 return
             value_b = True if value.lower() in true_options else False
             if key in self.conf:
-                self.conf[key] = value_b
-                with open(self.conf_file, 'w') as conf:
-                    yaml.dump(self.conf, conf, default_flow_style=False)
+                current = self.conf['current']
+                update_yaml(self.conf_file, {key: value_b})
                 self.update_config()
+                self.conf['current'] = current
             else:
                 print('{} is not a valid configuration option'.format(key))
 
@@ -411,7 +764,7 @@ class GKeep(cmd.Cmd):
 
     def do_entries(self, arg):
         """
-        KEEP:Shows  all lists and notes for the user
+        KEEP:Shows  all lists and notes for the user, archived entries are hidden by default
 
         Usage:
             ~> entries all   : Included archived and deleted items
@@ -421,9 +774,14 @@ class GKeep(cmd.Cmd):
         Optional Arguments:
             --show           : Shows all unchecked items for all Active lists
             --pinned         : Shows only pinned entries
+            --archived       : Shows only archived entries
+            --color <color>  : Shows only entries with the given color
+            --label <label>  : Shows only entries with the given label
 
         Ex:
             ~> entries lists --show
+            ~> entries notes --archived --color red
+            ~> entries lists --label work
 
         Note:
             Use shortcut el to replace entries lists --show
@@ -432,79 +790,81 @@ class GKeep(cmd.Cmd):
             ~> elp
         """
         self.do_clear(None)
-        line = "".join(arg.split())
-        show = True if '--show' in line else False
-        pinned_only = True if '--pinned' in line else False
-        active = True
-        notes = False
-        lists = False
-        if 'all' in line:
-            active = False
-        elif 'notes' in line:
-            notes = True
-        elif 'lists' in line:
-            lists = True
+        entries_args = argparse.ArgumentParser(prog='', usage='', add_help=False)
+        entries_args.add_argument('kind', action='store', default=None, nargs='?',
+                                  choices=options_entries)
+        entries_args.add_argument('--show', action='store_true')
+        entries_args.add_argument('--pinned', action='store_true')
+        entries_args.add_argument('--archived', action='store_true')
+        entries_args.add_argument('--color', action='store', default=None,
+                                  choices=list(colors.keys()))
+        entries_args.add_argument('--label', action='store', default=None, nargs='+')
+        try:
+            args = entries_args.parse_args(arg.split())
+        except SystemExit:
+            self.do_help('entries')
+            return
         print()
         try:
-            _ = self.entries
+            _ = self.index
         except AttributeError:
             if self.offline:
                 print('In offline mode, you need to load data first, use the load command')
                 print()
-                return
-        pinned = []
-        unpinned = []
-        for n in self.entries:
-            pinned.append(n) if n.pinned else unpinned.append(n)
-
+            return
+        query = {'color': args.color}
+        if args.label is not None:
+            query['label'] = ' '.join(args.label)
+        if args.kind != 'all':
+            query['trashed'] = False
+            query['archived'] = args.archived
+        elif args.archived:
+            query['archived'] = True
+        if args.kind == 'notes':
+            query['type'] = 'Note'
+        elif args.kind == 'lists':
+            query['type'] = 'List'
+        show = args.show and args.kind == 'lists'
+        pinned = self.index.select(pinned=True, **query)
         if len(pinned) > 0:
             print('* Pinned entries *: \n')
         for n in pinned:
-            display = True
-            if n.trashed:
-                status = 'Deleted'
-                if active or notes or lists:
-                    display = False
-            else:
-                status = 'Active'
-                if notes and n.type.name == 'List':
-                    display = False
-                if lists and n.type.name == 'Note':
-                    display = False
-            data = {'title': get_color(n, self.termcolor), 'status': status, 'type': n.type.name}
-            if n.type.name == 'List':
-                data['type'] = colored(n.type.name, 'cyan', self.termcolor)
-            if display:
-                print('- {title: <30} {status: <10}  [ {type} ]'.format(**data))
-            if show and lists and n.type.name == 'List':
-                print_list(n, self.termcolor, only_unchecked=True)
-                print()
+            self.print_entry(n, show)
         print()
-        if len(unpinned) and not pinned_only > 0:
-            print('* Unpinned entries *: \n')
+        if not args.pinned:
+            unpinned = self.index.select(pinned=False, **query)
+            if len(unpinned) > 0:
+                print('* Unpinned entries *: \n')
             for n in unpinned:
-                display = True
-                if n.trashed:
-                    status = 'Deleted'
-                    if active or notes or lists:
-                        display = False
-                else:
-                    status = 'Active'
-                    if notes and n.type.name == 'List':
-                        display = False
-                    if lists and n.type.name == 'Note':
-                        display = False
-                data = {'title': get_color(n, self.termcolor), 'status': status, 'type': n.type.name}
-                if n.type.name == 'List':
-                    data['type'] = colored(n.type.name, 'cyan', self.termcolor)
-                if display:
-                    print('- {title: <30} {status: <10}  [ {type} ]'.format(**data))
-                if show and lists and n.type.name == 'List':
-                    print_list(n, self.termcolor, only_unchecked=True)
-                    print()
+                self.print_entry(n, show)
         print()
 
+    def print_entry(self, n, show=False):
+        """
+        Prints a single line summary of an entry, and its unchecked items when show is True
+        """
+        if n.trashed:
+            status = 'Deleted'
+        elif n.archived:
+            status = 'Archived'
+        else:
+            status = 'Active'
+        data = {'title': get_color(n, self.termcolor), 'status': status, 'type': n.type.name}
+        if n.type.name == 'List':
+            data['type'] = colored(n.type.name, 'cyan', self.termcolor)
+        print('- {title: <30} {status: <10}  [ {type} ]'.format(**data))
+        if show and n.type.name == 'List':
+            print_list(n, self.termcolor, only_unchecked=True)
+            print()
+
     def complete_entries(self, text, line, start_index, end_index):
+        words = line[:start_index].split()
+        if words[-1] == '--color':
+            return [option for option in colors.keys() if option.startswith(text)]
+        if words[-1] == '--label':
+            return [option for option in self.label_names if option.startswith(text)]
+        if line[:start_index].endswith('--'):
+            return [option for option in options_entries_flags if option.startswith(text)]
         if text:
             return [option for option in options_entries if option.startswith(text)]
         else:
@@ -515,28 +875,97 @@ class GKeep(cmd.Cmd):
         KEEP:Print content os List/Note
 
         Usage:
-            ~> show <name of list/note>
+            ~> show <name of list/note> [options]
+
+        Optional Arguments:
+            --limit <n>        : Shows at most n items (lines for notes)
+            --offset <n>       : Skips the first n items (lines for notes)
+            --unchecked-only   : Shows only unchecked items (lists only)
+            --since <date>     : Shows only items updated since date (YYYY-MM-DD, today,
+                                 yesterday or -N days, lists only)
+            --pager            : Shows one screen (or --limit items) at a time
+
+        Ex:
+            ~> show Groceries --unchecked-only --limit 20
+            ~> show --since -7 --pager          : current list, items of the last week
         """
-        if arg == '' and self.current is None:
+        title, _, flags = (' ' + arg).partition(' --')
+        title = title.strip()
+        show_args = argparse.ArgumentParser(prog='', usage='', add_help=False)
+        show_args.add_argument('--limit', action='store', default=None, type=int)
+        show_args.add_argument('--offset', action='store', default=0, type=int)
+        show_args.add_argument('--unchecked-only', action='store_true')
+        show_args.add_argument('--since', action='store', default=None)
+        show_args.add_argument('--pager', action='store_true')
+        try:
+            args = show_args.parse_args(('--' + flags).split() if flags else [])
+        except SystemExit:
             self.do_help('show')
             return
-        if arg == '' and self.current is not None:
-            arg = self.current.title
+        since = None
+        if args.since is not None:
+            since = parse_date(args.since)
+            if since is None:
+                print(colored('\nCannot read date {}\n'.format(args.since), 'red', self.termcolor))
+                return
+        if title == '' and self.current is None:
+            self.do_help('show')
+            return
+        if title == '' and self.current is not None:
+            title = self.current.title
         for n in self.entries:
-            if arg == n.title:
+            if title == n.title:
                 print()
-                title = colored('============{:=<30}'.format(' '+n.title+' '),
-                                get_color(n, self.termcolor, True), self.termcolor)
-                print(title)
+                header = colored('============{:=<30}'.format(' '+n.title+' '),
+                                 get_color(n, self.termcolor, True), self.termcolor)
+                print(header)
                 print()
-                print(n.text) if n.type.name == 'Note' else print_list(n, self.termcolor)
+                self.show_window(n, args, since)
                 bottom = colored('============{:=<30}'.format(' '+n.title+' '),
                                  get_color(n, self.termcolor, True), self.termcolor)
                 print(bottom)
 
                 print()
 
+    def show_window(self, n, args, since):
+        """
+        Prints the requested window of a list/note. With the pager the next window is only
+        fetched and formatted when asked for.
+        """
+        limit = args.limit
+        if args.pager and limit is None:
+            limit = max(5, shutil.get_terminal_size().lines - 8)
+        offset = max(0, args.offset)
+        if n.type.name == 'Note' and (since is not None or args.unchecked_only):
+            print(colored('--since and --unchecked-only only apply to lists',
+                          'red', self.termcolor))
+            return
+        if n.type.name == 'Note':
+            lines = n.text.splitlines()
+            shown = lines[offset:None if limit is None else offset + limit]
+            print('\n'.join(shown)) if shown else None
+            total = len(lines)
+        else:
+            total = print_list(n, self.termcolor, args.unchecked_only, offset, limit, since)
+        while args.pager and offset + limit < total:
+            answer = input(colored('-- {}-{} of {}, Enter for more, q to quit --'.format(
+                           offset + 1, offset + limit, total), 'cyan', self.termcolor))
+            if answer.strip().lower().startswith('q'):
+                break
+            offset += limit
+            if n.type.name == 'Note':
+                print('\n'.join(lines[offset:offset + limit]))
+            else:
+                print_list(n, self.termcolor, args.unchecked_only, offset, limit, since,
+                           header=False)
+        if limit is not None and not args.pager and offset + limit < total:
+            print(colored('-- {}-{} of {}, use --offset {} for more --'.format(
+                          offset + 1, offset + limit, total, offset + limit),
+                          'cyan', self.termcolor))
+
     def complete_show(self, text, line, start_index, end_index):
+        if line[:start_index].endswith('--'):
+            return [option for option in options_show if option.startswith(text)]
         if text:
             return [option for option in self.titles if option.startswith(text)]
         else:
@@ -564,6 +993,107 @@ class GKeep(cmd.Cmd):
                     self.do_refresh(None)
                 print()
 
+    def do_cleanup(self, arg):
+        """
+        KEEP:Archive, delete or purge checked items of stale entries in one go. Entries are
+        selected by age, fully checked state and/or trashed state (all given conditions
+        must match), everything is applied after a single confirmation and a single sync
+
+        Usage:
+            ~> cleanup <selection> [<action>] [--dry-run]
+
+        Selection:
+            --older-than <days> : Entries not updated in the last <days> days
+            --done              : Lists with all their items checked
+            --trashed           : Entries in the trash (otherwise they are left out)
+
+        Actions (without one the selection is only shown):
+            --archive           : Archives the entries
+            --delete            : Moves the entries to the trash, entries already in the
+                                  trash are deleted for good
+            --purge-checked     : Deletes the checked items of the selected lists
+
+        Ex:
+            ~> cleanup --done --older-than 30 --archive
+            ~> cleanup --trashed --delete --dry-run
+        """
+        cleanup_args = argparse.ArgumentParser(prog='', usage='', add_help=False)
+        cleanup_args.add_argument('--older-than', action='store', default=None, type=int)
+        cleanup_args.add_argument('--done', action='store_true')
+        cleanup_args.add_argument('--trashed', action='store_true')
+        actions = cleanup_args.add_mutually_exclusive_group()
+        actions.add_argument('--archive', action='store_true')
+        actions.add_argument('--delete', action='store_true')
+        actions.add_argument('--purge-checked', action='store_true')
+        cleanup_args.add_argument('--dry-run', action='store_true')
+        try:
+            args = cleanup_args.parse_args(arg.split())
+        except SystemExit:
+            self.do_help('cleanup')
+            return
+        if args.older_than is None and not args.done and not args.trashed:
+            self.do_help('cleanup')
+            return
+        query = {'trashed': args.trashed}
+        if args.done:
+            query['type'] = 'List'
+        if args.older_than is not None:
+            cutoff = (datetime.datetime.now(datetime.timezone.utc) -
+                      datetime.timedelta(days=args.older_than))
+            if self.index.updated and self.index.updated[0][0].tzinfo is None:
+                cutoff = cutoff.replace(tzinfo=None)
+            query['updated_before'] = cutoff
+        if args.archive:
+            query['archived'] = False
+        if args.purge_checked:
+            query['type'] = 'List'
+        matches = self.index.select(**query)
+        if args.done:
+            matches = [n for n in matches if n.items and not n.unchecked]
+        if args.purge_checked:
+            matches = [(n, [i for i in n.checked]) for n in matches]
+            matches = [(n, checked) for n, checked in matches if checked]
+        else:
+            matches = [(n, None) for n in matches]
+        print()
+        if not matches:
+            print('Nothing to clean up\n')
+            return
+        for n, checked in matches:
+            print('- {: <35} {}{}'.format(
+                  get_color(n, self.termcolor), n.timestamps.updated.strftime('%Y-%m-%d'),
+                  ' ({} checked)'.format(len(checked)) if checked is not None else ''))
+        action = 'archive' if args.archive else 'delete' if args.delete else \
+                 'purge checked items of' if args.purge_checked else None
+        print()
+        if action is None or args.dry_run:
+            if action is not None:
+                print('Would {} {} entries (dry run)\n'.format(action, len(matches)))
+            return
+        question = 'Are you sure you want to {} {} entries?\n'.format(action, len(matches))
+        if args.delete and not args.trashed:
+            question += 'They are moved to the trash '
+        elif not args.archive:
+            question += 'This is irreversible '
+        question = colored(question + '[spell out yes]: ', 'red', self.termcolor)
+        if input(question).lower() not in ['yes']:
+            return
+        for n, checked in matches:
+            if args.archive:
+                n.archived = True
+            elif args.delete and n.trashed:
+                n.delete()
+            elif args.delete:
+                n.trash()
+            else:
+                for item in checked:
+                    item.delete()
+        print('Done, {} {} entries'.format(action, len(matches)))
+        self.do_refresh(None)
+
+    def complete_cleanup(self, text, line, start_index, end_index):
+        return [option for option in options_cleanup if option.startswith(text)]
+
     def complete_delete(self, text, line, start_index, end_index):
         if text:
             return [option for option in self.titles if option.startswith(text)]
@@ -620,6 +1150,62 @@ class GKeep(cmd.Cmd):
             else:
                 return options_current
 
+    def do_label(self, arg):
+        """
+        KEEP:Add or remove labels from the current note/list, or list all labels
+
+        Usage:
+            ~> label list            : Lists all labels and how many entries use them
+            ~> label add <label>     : Adds <label> to current note/list, creating it if needed
+            ~> label remove <label>  : Removes <label> from current note/list
+
+        Note:
+            Use entries --label <label> to show all entries with a given label
+        """
+        line = arg.strip()
+        if line.startswith('list'):
+            print()
+            for name in self.label_names:
+                count = self.index.count(trashed=False, label=name)
+                print('- {: <30} {} entries'.format(name, count))
+            print()
+            return
+        if line.startswith('add'):
+            action = 'add'
+        elif line.startswith('remove'):
+            action = 'remove'
+        else:
+            self.do_help('label')
+            return
+        name = line[len(action):].strip()
+        if name == '':
+            print(colored('\nLabel cannot be empty\n', 'red', self.termcolor))
+            return
+        if self.current is None:
+            print('Not Note or List is selected, use the command: useList or useNote')
+            return
+        label = self.keep.findLabel(name)
+        if action == 'add':
+            if label is None:
+                print('Creating label: {}'.format(name))
+                label = self.keep.createLabel(name)
+            self.current.labels.add(label)
+        else:
+            if label is None or self.current.labels.get(label.id) is None:
+                print('{} does not have label {}'.format(self.current.title, name))
+                return
+            self.current.labels.remove(label)
+        self.do_refresh(None)
+
+    def complete_label(self, text, line, start_index, end_index):
+        words = line[:start_index].split()
+        if len(words) > 1 and words[1] in ['add', 'remove']:
+            return [option for option in self.label_names if option.startswith(text)]
+        if text:
+            return [option for option in options_label if option.startswith(text)]
+        else:
+            return options_label
+
     def do_create(self, arg):
         """
         KEEP:Create a note or a list
@@ -649,6 +1235,75 @@ class GKeep(cmd.Cmd):
             self.keep.createList(title)
             self.do_refresh(None)
 
+    def do_template(self, arg):
+        """
+        KEEP:Save lists as templates and create them again, with their items, color and pin
+        state. All the lists of a template are created locally and sent in a single sync
+
+        Usage:
+            ~> template save <list> [--as name]    : Saves a list into template name (default
+                                                     the list title), a template can hold
+                                                     several lists
+            ~> template apply <name> [--as title]  : Creates the lists of a template, --as
+                                                     sets the title of a single list template
+            ~> template list                       : Shows templates
+            ~> template remove <name>              : Deletes a template
+        """
+        line = arg.strip()
+        action, _, rest = line.partition(' ')
+        rest, _, alias = rest.partition('--as')
+        rest, alias = rest.strip(), alias.strip()
+        if action == 'save':
+            List = None
+            for n in self.lists_obj:
+                if rest == n.title:
+                    List = n
+            if List is None:
+                print(colored('\nList {} not found\n'.format(rest), 'red', self.termcolor))
+                return
+            lists = self.templates.save(alias or List.title, List)
+            print('Saved {} ({} items) in template {} ({} lists)'.format(
+                  List.title, len(List.items), alias or List.title, len(lists)))
+        elif action == 'apply':
+            lists = self.templates.load().get(rest)
+            if lists is None:
+                print(colored('\nTemplate {} not found\n'.format(rest), 'red', self.termcolor))
+                return
+            if alias and len(lists) > 1:
+                print(colored('\n--as needs a single list template, {} has {}\n'.format(
+                              rest, len(lists)), 'red', self.termcolor))
+                return
+            for template in lists:
+                List = instantiate(self.keep, template, alias or None)
+                print('Creating list: {} ({} items)'.format(List.title, len(template['items'])))
+            self.do_refresh(None)
+        elif action == 'list':
+            print()
+            for name, lists in sorted(self.templates.load().items()):
+                print('- {: <25} {}'.format(name, ', '.join(
+                      '{} ({})'.format(t['title'], len(t['items'])) for t in lists)))
+            print()
+        elif action == 'remove':
+            if self.templates.remove(rest):
+                print('Template {} removed'.format(rest))
+            else:
+                print(colored('\nTemplate {} not found\n'.format(rest), 'red', self.termcolor))
+        else:
+            self.do_help('template')
+
+    def complete_template(self, text, line, start_index, end_index):
+        words = line[:start_index].split()
+        if len(words) > 1 and words[1] == 'save':
+            temp = line[line.index(words[1]) + len(words[1]):].lstrip()
+            return self.complete_items(text, temp, self.lists)
+        if len(words) > 1 and words[1] in ['apply', 'remove']:
+            temp = line[line.index(words[1]) + len(words[1]):].lstrip()
+            return self.complete_items(text, temp, sorted(self.templates.load()))
+        if text:
+            return [option for option in options_template if option.startswith(text)]
+        else:
+            return options_template
+
     def complete_create(self, text, line, start_index, end_index):
         if text:
             return [option for option in options_commands if option.startswith(text)]
@@ -667,7 +1322,7 @@ class GKeep(cmd.Cmd):
             ~> ul <title>
         """
         for n in self.entries:
-            if arg == n.title and arg in self.lists:
+            if arg == n.title and n in self.lists_obj:
                 print()
                 print('Current List set to: {}'.format(n.title))
                 self.current = n
@@ -675,9 +1330,14 @@ class GKeep(cmd.Cmd):
                 self.prompt = 'keepcli [{}] ~> '.format(
                      colored(n.title[:15] + (n.title[15:] and '...'),
                              get_color(n, self.termcolor, color_only=True), self.termcolor))
-                self.current_checked = [i.text for i in n.checked]
-                self.current_unchecked = [i.text for i in n.unchecked]
-                self.current_all_items = self.current_checked + self.current_unchecked
+                self.set_current_items(n)
+                self.update_catalog()
+
+    def set_current_items(self, List):
+        """ Item names of the current list offered by completion"""
+        self.current_checked = [i.text for i in List.checked]
+        self.current_unchecked = [i.text for i in List.unchecked]
+        self.current_all_items = self.current_checked + self.current_unchecked
 
     def complete_useList(self, text, line, start_index, end_index):
         if text:
@@ -697,7 +1357,7 @@ class GKeep(cmd.Cmd):
             ~> un <title>
         """
         for n in self.entries:
-            if arg == n.title and arg in self.notes:
+            if arg == n.title and n in self.notes_obj:
                 print()
                 print('Current Note set to: {}'.format(n.title))
                 self.prompt = 'keepcli [{}] ~> '.format(
@@ -705,6 +1365,7 @@ class GKeep(cmd.Cmd):
                              get_color(n, self.termcolor, color_only=True), self.termcolor))
                 self.current = n
                 self.conf['current'] = n.title
+                self.update_catalog()
 
     def complete_useNote(self, text, line, start_index, end_index):
         if text:
@@ -728,6 +1389,60 @@ class GKeep(cmd.Cmd):
         else:
             print('{} is not a Note'.format(self.current.title))
 
+    def do_edit(self, arg):
+        """
+        KEEP:Edit the current note, or the current list as one item per line, in $EDITOR.
+        Nothing is synced if the content did not change
+
+        Usage:
+            ~> edit
+
+        Note:
+            For lists, checked items start with 'x ', sub-items are indented and the order
+            of the lines is the order of the items. Only the items that changed are updated
+        """
+        if self.current is None:
+            print('Not Note or List is selected, use the command: useList or useNote')
+            return
+        is_list = self.current.type.name == 'List'
+        before = render(self.current)
+        editor = os.environ.get('VISUAL') or os.environ.get('EDITOR') or 'vi'
+        fd, path = tempfile.mkstemp(prefix='keepcli-', suffix='.txt' if is_list else '.md')
+        try:
+            with os.fdopen(fd, 'w') as tmp:
+                tmp.write(before)
+            if subprocess.call(shlex.split(editor) + [path]) != 0:
+                print(colored('\nEditor exited with an error, nothing changed\n',
+                              'red', self.termcolor))
+                return
+            with open(path, 'r') as tmp:
+                after = tmp.read()
+        finally:
+            os.remove(path)
+        if digest(after) == digest(before):
+            print('No changes')
+            return
+        if is_list:
+            changes = apply_list(self.current, parse_list(after))
+        else:
+            title, text = parse_note(after)
+            changes = 0
+            if title is not None and title != self.current.title:
+                self.current.title = title
+                changes += 1
+            if text != self.current.text:
+                self.current.text = text
+                changes += 1
+        if changes == 0:
+            print('No changes')
+            return
+        print('{} changes'.format(changes))
+        self.do_refresh(None)
+        if is_list:
+            self.do_useList(self.current.title)
+        else:
+            self.do_useNote(self.current.title)
+
     def do_checkItem(self, arg):
         """
         KEEP:Mark an item as completed in a current list
@@ -878,13 +1593,15 @@ class GKeep(cmd.Cmd):
 
     def do_addItem(self, arg):
         """
-        KEEP: Add a new item to current lists
+        KEEP: Add a new item to current lists, optionally as a sub-item of an existing item
 
         Usage:
             ~> addItem <item>
+            ~> addItem <item> --under <parent item>
 
         Ex:
             ~> addItem get milk
+            ~> addItem oat milk --under get milk
 
         Note:
             You can also use the shortcut ai:
@@ -894,17 +1611,136 @@ class GKeep(cmd.Cmd):
             print('Not Note or List is selected, use the command: useList or useNote')
             return
         if self.current.type.name == 'List':
-            new = arg.lstrip()
+            new, _, under = arg.partition('--under')
+            new = new.strip()
             if new == '':
                 self.do_help('addItem')
                 return
-            self.current.add(new)
+            parent = None
+            if under.strip() != '':
+                parent = self.find_item(under.strip())
+                if parent is None:
+                    print(colored('\nItem {} not found\n'.format(under.strip()),
+                                  'red', self.termcolor))
+                    return
+            for List, dup in self.item_index.find(new):
+                print(colored('Warning: {} already in {}{}'.format(
+                              dup.text, List.title, ' (checked)' if dup.checked else ''),
+                              'yellow', self.termcolor))
+            item = self.current.add(new)
+            if parent is not None:
+                parent.indent(item)
             self.do_refresh(None)
             if self.autosync:
                 self.do_useList(self.current.title)
         else:
             print('{} is not a List'.format(self.current.title))
 
+    def complete_addItem(self, text, line, start_index, end_index):
+        if '--under' in line:
+            temp = line[line.index('--under') + len('--under'):].lstrip()
+            return self.complete_items(text, temp, self.current_unchecked)
+        if line[:start_index].endswith('--'):
+            return ['under']
+        return []
+
+    def complete_items(self, text, temp, options):
+        """
+        Completes item names that may contain spaces, temp is everything typed so far
+        """
+        if text:
+            temp2 = temp.split()[-1]
+            return [temp2 + option[option.startswith(temp) and len(temp):]
+                    for option in options if option.startswith(temp)]
+        if temp == '':
+            return options
+        return [option[len(temp):] for option in options if option.startswith(temp)]
+
+    def find_item(self, text):
+        """
+        Returns the item of the current list with the given text, None if not found
+        """
+        for item in self.current.items:
+            if text == item.text:
+                return item
+        return None
+
+    def do_indentItem(self, arg):
+        """
+        KEEP:Make an item of the current list a sub-item of another item
+
+        Usage:
+            ~> indentItem <item> --under <parent item>
+        """
+        if self.current is None or self.current.type.name != 'List':
+            print('Not List is selected, use the command: useList')
+            return
+        text, _, under = arg.partition('--under')
+        if text.strip() == '' or under.strip() == '':
+            self.do_help('indentItem')
+            return
+        item = self.find_item(text.strip())
+        parent = self.find_item(under.strip())
+        if item is None or parent is None:
+            print(colored('\nItem not found\n', 'red', self.termcolor))
+            return
+        if item is parent or parent.super_list_item_id:
+            print('Items can only be nested one level deep')
+            return
+        if item.subitems:
+            print('{} has sub-items, dedent them first'.format(item.text))
+            return
+        if item.super_list_item_id:
+            self.dedent_item(item)
+        parent.indent(item)
+        self.do_refresh(None)
+        self.do_useList(self.current.title)
+
+    def complete_indentItem(self, text, line, start_index, end_index):
+        if '--under' in line:
+            temp = line[line.index('--under') + len('--under'):].lstrip()
+            return self.complete_items(text, temp, self.current_all_items)
+        temp = line[line.startswith('indentItem') and len('indentItem'):].lstrip()
+        return self.complete_items(text, temp, self.current_all_items)
+
+    def dedent_item(self, item):
+        parent = item.parent_item
+        if parent is None:
+            parent = self.current.get(item.super_list_item_id)
+        if parent is not None:
+            parent.dedent(item)
+        else:
+            item.super_list_item_id = ''
+            item.touch(True)
+
+    def do_dedentItem(self, arg):
+        """
+        KEEP:Move a sub-item of the current list back to the top level
+
+        Usage:
+            ~> dedentItem <item>
+        """
+        if self.current is None or self.current.type.name != 'List':
+            print('Not List is selected, use the command: useList')
+            return
+        if arg.strip() == '':
+            self.do_help('dedentItem')
+            return
+        item = self.find_item(arg.strip())
+        if item is None:
+            print(colored('\nItem not found\n', 'red', self.termcolor))
+            return
+        if not item.super_list_item_id:
+            print('{} is not a sub-item'.format(item.text))
+            return
+        self.dedent_item(item)
+        self.do_refresh(None)
+        self.do_useList(self.current.title)
+
+    def complete_dedentItem(self, text, line, start_index, end_index):
+        temp = line[line.startswith('dedentItem') and len('dedentItem'):].lstrip()
+        return self.complete_items(text, temp, self.current_all_items)
+
     def do_moveItem(self, arg):
         """
         KEEP:Move items from current list to another
@@ -974,14 +1810,370 @@ class GKeep(cmd.Cmd):
                            for option in self.current_unchecked if option.startswith(temp)]
                 return options
 
+    def do_remind(self, arg):
+        """
+        KEEP:Set or clear a due date on the current note/list or on one of its items.
+        Due dates are kept in ~/.keepcli/due.yaml by entry id, Keep content is not changed
+
+        Usage:
+            ~> remind --on <date>          : Sets due date of current note/list
+            ~> remind <item> --on <date>   : Sets due date of an item in current list
+            ~> remind [<item>] --clear     : Removes the due date
+
+        Dates can be YYYY-MM-DD, today, tomorrow or +N (N days from today)
+
+        Ex:
+            ~> remind get milk --on tomorrow
+        """
+        if self.current is None:
+            print('Not Note or List is selected, use the command: useList or useNote')
+            return
+        if '--on' in arg:
+            target, _, value = arg.partition('--on')
+            due = parse_date(value)
+            if due is None:
+                print(colored('\nDate {} not valid\n'.format(value.strip()), 'red', self.termcolor))
+                return
+        elif '--clear' in arg:
+            target = arg[:arg.index('--clear')]
+            due = None
+        else:
+            self.do_help('remind')
+            return
+        target = target.strip()
+        if target == '':
+            self.due_dates.set(self.current, due)
+        else:
+            if self.current.type.name != 'List':
+                print('{} is not a List'.format(self.current.title))
+                return
+            for item in self.current.items:
+                if target == item.text:
+                    self.due_dates.set(item, due, self.current)
+                    break
+            else:
+                print(colored('\nItem not found\n', 'red', self.termcolor))
+                return
+        self.agenda.update(self.entries, self.due_dates.load())
+
+    def complete_remind(self, text, line, start_index, end_index):
+        if '--' in line:
+            return [option for option in ['on', 'clear'] if option.startswith(text)]
+        temp = line[line.startswith('remind') and len('remind'):].lstrip()
+        if text:
+            temp2 = temp.split()[-1]
+            return [temp2 + option[option.startswith(temp) and len(temp):]
+                    for option in self.current_unchecked if option.startswith(temp)]
+        else:
+            if temp == '':
+                return self.current_unchecked
+            return [option[len(temp):]
+                    for option in self.current_unchecked if option.startswith(temp)]
+
+    def do_agenda(self, arg):
+        """
+        KEEP:Shows notes, lists and unchecked items with a due date, in due order
+
+        Usage:
+            ~> agenda          : Shows overdue and due today
+            ~> agenda week     : Shows everything due in the next 7 days
+            ~> agenda all      : Shows everything with a due date
+
+        Note:
+            Use remind to set due dates
+        """
+        today = datetime.date.today()
+        if 'all' in arg:
+            limit = None
+        elif 'week' in arg:
+            limit = today + datetime.timedelta(days=7)
+        else:
+            limit = today
+        print()
+        count = 0
+        for due, node, parent in self.agenda.until(limit):
+            count += 1
+            color = 'red' if due < today else 'yellow' if due == today else 'white'
+            if parent is None:
+                where = colored(node.type.name, 'cyan', self.termcolor)
+                text = get_color(node, self.termcolor) if node.type.name == 'List' else node.title
+            else:
+                where = get_color(parent, self.termcolor)
+                text = node.text
+            print('{} - {: <40} [ {} ]'.format(colored(due.isoformat(), color, self.termcolor),
+                                               text, where))
+        if count == 0:
+            print('Nothing due')
+        print()
+
+    def complete_agenda(self, text, line, start_index, end_index):
+        if text:
+            return [option for option in options_agenda if option.startswith(text)]
+        else:
+            return options_agenda
+
+    def do_mirror(self, arg):
+        """
+        KEEP:Mirror lists and notes to local files (todo.txt for lists, Markdown for notes)
+        and keep both sides in sync. Only entries changed on either side since the last
+        mirror are transferred, all local changes are sent in a single sync
+
+        Usage:
+            ~> mirror                           : Syncs all mirrored entries both ways
+            ~> mirror add <title> [--file name] : Mirrors a list/note
+            ~> mirror remove <title>            : Stops mirroring a list/note
+            ~> mirror list                      : Shows mirrored entries and their files
+            ~> mirror dir [<path>]              : Shows or sets the mirror directory
+
+        Note:
+            In todo.txt files checked items start with 'x ' and sub-items are indented.
+            When an entry changed on both sides Keep wins and the local file is saved
+            with a .conflict extension, so is a file that already existed with another
+            content when the entry was added
+        """
+        line = arg.strip()
+        if line.startswith('add') or line.startswith('remove'):
+            action, _, title = line.partition(' ')
+            title, _, filename = title.partition('--file')
+            node = None
+            for n in self.entries:
+                if title.strip() == n.title and not n.trashed:
+                    node = n
+            if node is None:
+                print(colored('\n{} not found\n'.format(title.strip()), 'red', self.termcolor))
+                return
+            if action == 'add':
+                self.mirror.add(node, filename.strip() or None)
+                print('Mirroring {} to {}'.format(node.title, self.mirror.path(node.id)))
+            else:
+                self.mirror.remove(node.id)
+                print('{} not mirrored anymore'.format(node.title))
+            self.mirror.save()
+            return
+        if line.startswith('list'):
+            print()
+            for node_id, state in self.mirror.entries.items():
+                print('- {: <30} {}'.format(state['title'], self.mirror.path(node_id)))
+            print()
+            return
+        if line.startswith('dir'):
+            path = line[len('dir'):].strip()
+            if path != '':
+                self.mirror.directory = os.path.abspath(os.path.expanduser(path))
+                self.mirror.save()
+            print('Mirror directory: {}'.format(self.mirror.directory))
+            return
+        if line not in ['', 'sync']:
+            self.do_help('mirror')
+            return
+        pushed = {}
+        conflicts = 0
+        for node_id in list(self.mirror.entries):
+            node = self.keep.get(node_id)
+            if node is None or node.trashed:
+                continue
+            text = self.mirror.local_change(node_id)
+            if text is None:
+                continue
+            if self.mirror.remote_changed(node_id, node):
+                first = self.mirror.entries[node_id]['hash'] is None
+                if first and text == render(node):
+                    continue
+                conflicts += 1
+                path = self.mirror.path(node_id)
+                os.replace(path, path + '.conflict')
+                print(colored('{} {}, local copy saved as {}.conflict'.format(
+                              node.title, 'file already existed' if first else
+                              'changed on both sides', path), 'red', self.termcolor))
+                continue
+            self.mirror.push(node, text)
+            pushed[node_id] = text
+        self.do_refresh(None, force_sync=True)
+        pulled = 0
+        for node_id in list(self.mirror.entries):
+            node = self.keep.get(node_id)
+            if node is None or node.trashed:
+                print(colored('{} does not exist anymore'.format(
+                              self.mirror.entries[node_id]['title']), 'red', self.termcolor))
+                continue
+            if node_id in pushed or self.mirror.remote_changed(node_id, node) or \
+                    not os.path.exists(self.mirror.path(node_id)):
+                if self.mirror.pull(node, pushed.get(node_id)):
+                    pulled += 1
+        self.mirror.save()
+        print('Mirror: {} pushed, {} pulled, {} conflicts'.format(len(pushed), pulled, conflicts))
+
+    def complete_mirror(self, text, line, start_index, end_index):
+        words = line[:start_index].split()
+        if len(words) > 1 and words[1] in ['add', 'remove']:
+            temp = line[line.index(words[1]) + len(words[1]):].lstrip()
+            return self.complete_items(text, temp, self.titles)
+        if text:
+            return [option for option in options_mirror if option.startswith(text)]
+        else:
+            return options_mirror
+
+    def do_media(self, arg):
+        """
+        KEEP:List, download and open images, drawings and audio attached to notes/lists.
+        Downloads are cached on disk, cached attachments open without network access
+
+        Usage:
+            ~> media [list]      : Lists attachments of current note/list
+            ~> media fetch       : Downloads attachments of current note/list
+            ~> media fetch all   : Downloads attachments of all entries
+            ~> media open <n>    : Opens attachment number <n> from media list
+            ~> media clear       : Empties the media cache
+        """
+        line = arg.strip()
+        if line == 'clear':
+            self.media.clear()
+            self.media.save()
+            print('Media cache cleared')
+            return
+        if line == 'fetch all':
+            entries = self.index.select(trashed=False)
+        else:
+            if self.current is None:
+                print('Not Note or List is selected, use the command: useList or useNote')
+                return
+            entries = [self.current]
+        blobs = [blob for n in entries for blob in n.blobs]
+        if line in ['', 'list']:
+            print()
+            for i, blob in enumerate(blobs):
+                cached = 'cached' if self.media.get(blob.id) else ''
+                print('{: >3}: {: <40} {}'.format(i, describe(blob), cached))
+            if not blobs:
+                print('No attachments')
+            print()
+        elif line.startswith('fetch'):
+            self.fetch_media(blobs)
+        elif line.startswith('open'):
+            try:
+                blob = blobs[int(line[len('open'):])]
+            except (ValueError, IndexError):
+                self.do_help('media')
+                return
+            if self.media.get(blob.id) is None:
+                self.fetch_media([blob])
+            path = self.media.get(blob.id)
+            if path is not None:
+                opener = 'open' if sys.platform == 'darwin' else 'xdg-open'
+                subprocess.Popen([opener, path], stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.DEVNULL)
+        else:
+            self.do_help('media')
+            return
+        self.media.save()
+
+    def fetch_media(self, blobs):
+        """
+        Downloads the given attachments that are not cached yet, in parallel
+        """
+        missing = [blob for blob in blobs if self.media.get(blob.id) is None]
+        if not missing:
+            return
+        if self.offline:
+            print(colored('{} attachments not cached, cannot download while offline'.format(
+                          len(missing)), 'red', self.termcolor))
+            return
+        try:
+            results = self.aio.run(fetch_blobs(self.aio, missing),
+                                   'Downloading {} attachments...'.format(len(missing)))
+        except KeyboardInterrupt:
+            print(colored('Download cancelled', 'red', self.termcolor))
+            return
+        for blob, result in zip(missing, results):
+            if isinstance(result, Exception):
+                print(colored('Could not download {}: {}'.format(describe(blob), result),
+                              'red', self.termcolor))
+                continue
+            self.media.put(blob.id, *result)
+
+    def complete_media(self, text, line, start_index, end_index):
+        if 'fetch' in line:
+            return [option for option in ['all'] if option.startswith(text)]
+        if text:
+            return [option for option in options_media if option.startswith(text)]
+        else:
+            return options_media
+
+    def do_dedupe(self, arg):
+        """
+        KEEP:Find items repeated across lists (ignoring case and spacing) and
+        optionally merge them
+
+        Usage:
+            ~> dedupe            : Reports duplicated items
+            ~> dedupe --merge    : Keeps one copy of each duplicated item and deletes the rest
+
+        Note:
+            When merging, the oldest unchecked copy is kept (the oldest checked one if all
+            are checked). Copies with sub-items are never deleted. All deletions are
+            confirmed once and synced together
+        """
+        merge = '--merge' in arg
+        groups = self.item_index.duplicates()
+        if not groups:
+            print('\nNo duplicated items\n')
+            return
+        to_delete = []
+        print()
+        for group in groups:
+            ordered = sorted(group, key=lambda pair: (pair[1].checked,
+                                                      pair[1].timestamps.created))
+            keep = ordered[0]
+            print('* {}'.format(keep[1].text))
+            for List, item in ordered:
+                state = colored('checked', 'green', self.termcolor) if item.checked else \
+                    colored('unchecked', 'red', self.termcolor)
+                action = ''
+                if merge and item is not keep[1] and not item.subitems:
+                    to_delete.append(item)
+                    action = ' --> delete'
+                print('    - {: <30} {}{}'.format(get_color(List, self.termcolor), state, action))
+        print()
+        if not merge:
+            print('{} duplicated items, use dedupe --merge to merge them'.format(len(groups)))
+            return
+        if not to_delete:
+            return
+        question = '\nAre you sure you want to delete {} items ?.\n'.format(len(to_delete))
+        question += 'This is irreversible [spell out yes]: '
+        if input(colored(question, 'red', self.termcolor)).lower() not in ['yes']:
+            return
+        for item in to_delete:
+            item.delete()
+        print('{} items deleted'.format(len(to_delete)))
+        self.do_refresh(None)
+        if self.current is not None and self.current.type.name == 'List':
+            self.do_useList(self.current.title)
+
+    def complete_dedupe(self, text, line, start_index, end_index):
+        return [option for option in ['merge'] if option.startswith(text)]
+
     def do_dump(self, arg):
         """
-        Pickle entries and current status for offline use
+        Pickle entries and current status for offline use. This is also done automatically
+        after changes when idle and on exit (see config checkpoint)
 
         Usage:
             ~> dump
         """
-        pickle.dump(self.keep, open(os.path.join(self.kcli_path, self.username+'.kci'), 'wb'))
+        try:
+            path = self.aio.run(self.aio.exclusive(self.checkpoint.write), 'Dumping...')
+        except KeyboardInterrupt:
+            # a dump makes no API request, once started it cannot be stopped
+            if self.aio.interrupted == RUNNING:
+                print(colored('Dump still running in the background', 'red', self.termcolor))
+                return
+            if self.aio.interrupted != FINISHED:
+                print(colored('Dump cancelled', 'red', self.termcolor))
+                return
+            path = self.snapshot_file()
+        if path is not None:
+            print('Offline data saved to {}'.format(path))
 
     def do_load(self, arg):
         """
@@ -990,11 +2182,21 @@ class GKeep(cmd.Cmd):
         Usage:
             ~> load
         """
-        with open(self.auth_file, 'r') as auth:
-            conn = yaml.load(auth)
-        self.username = conn['user']
-        self.keep = pickle.load(open(os.path.join(self.kcli_path, self.username+'.kci'), 'rb'))
+        try:
+            if self.username is None:
+                self.username = read_yaml(self.auth_file)['user']
+            self.keep = read_snapshot(self.snapshot_file())
+        except (IOError, OSError) as e:
+            print(colored('No offline data to load ({}), '
+                          'run keepcli online first'.format(e), 'red', self.termcolor))
+        pool_keep(self.keep, self.netstats, check=self.aio.check_cancelled)
+        if self.replay is not None:
+            self.replay.attach(self.keep)
+        self.aio.keep = self.keep
+        self.agenda = Agenda()
+        list_trees.invalidate()
         self.do_refresh(None)
+        self.checkpoint.dirty = False
 
     def do_clear(self, line):
         """
@@ -1019,25 +2221,28 @@ def write_conf(conf_file):
     defaults = {
                 'termcolor': True,
                 'autosync': True,
+                'checkpoint': True,
+                'adaptive_sync': False,
+                'metrics': False,
                 'current': '',
                }
-    if not os.path.exists(conf_file):
-        with open(conf_file, 'w') as conf:
-            yaml.dump(defaults, conf, default_flow_style=False)
-    else:
-        with open(conf_file, 'r') as conf:
-            current = yaml.load(conf)
-            for k in defaults.keys():
-                if current.get(k) is None:
-                    current[k] = defaults[k]
-        with open(conf_file, 'w') as conf:
-            yaml.dump(current, conf, default_flow_style=False)
+    with FileLock(conf_file):
+        current = {}
+        if os.path.exists(conf_file):
+            with open(conf_file, 'r') as conf:
+                current = yaml.safe_load(conf) or {}
+        missing = dict((k, v) for k, v in defaults.items() if current.get(k) is None)
+    if missing or not os.path.exists(conf_file):
+        update_yaml(conf_file, missing)
 
 
 def cli():
     """ Main command line interface function"""
-    online = True if os.system("ping -c 1 " + 'google.com' + '> /dev/null 2>&1') is 0 else False
-    if not online:
+    args = kcliparser.get_args()
+    # a replayed session never touches the network
+    online = True if os.environ.get('KEEPCLI_REPLAY') or \
+        os.system("ping -c 1 " + 'google.com' + '> /dev/null 2>&1') is 0 else False
+    if not online and not args.offline:
         print('You are offline, use the --offline option (and load your previously dumped data)')
         return
     kcli_path = os.path.join(os.environ["HOME"], ".keepcli/")
@@ -1049,9 +2254,21 @@ def cli():
         auth_file = os.path.join(kcli_path, "auth.yaml")
     conf_file = os.path.join(kcli_path, "config.yaml")
     write_conf(conf_file)
-    args = kcliparser.get_args()
     offline = True if args.offline else False
-    GKeep(auth_file=auth_file, conf_file=conf_file, offline=offline).cmdloop()
+    gkeep = GKeep(auth_file=auth_file, conf_file=conf_file, offline=offline)
+    if hasattr(signal, 'SIGHUP'):
+        # closing the terminal goes through a normal exit, so pending edits are synced
+        signal.signal(signal.SIGHUP, lambda signum, frame: sys.exit(1))
+    if args.command:
+        for command in args.command:
+            gkeep.onecmd(command)
+        gkeep.do_exit(None)
+    else:
+        try:
+            gkeep.cmdloop()
+        except KeyboardInterrupt:
+            print()
+            gkeep.do_exit(None)
 
 
 if __name__ == '__main__':
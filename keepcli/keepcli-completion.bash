@@ -0,0 +1,95 @@
+# bash/zsh TAB completion for keepcli -c "<command>"
+#
+# Completes from the catalog keepcli writes to ~/.keepcli/catalog.tsv on every refresh,
+# so it never starts python, imports gkeepapi or touches the network.
+#
+# Usage (in ~/.bashrc or ~/.zshrc):
+#     eval "$(keepcli --completion)"
+
+_keepcli_home() {
+    echo "${KEEPCLI_HOME:-$HOME/.keepcli}"
+}
+
+# _keepcli_catalog <kind> [<scope>] : prints the catalog values of a kind
+_keepcli_catalog() {
+    local catalog
+    catalog="$(_keepcli_home)/catalog.tsv"
+    [ -r "$catalog" ] || return 0
+    awk -F '\t' -v kind="$1" -v scope="$2" \
+        '$1 == kind && (scope == "" || $2 == scope) {print $3}' "$catalog"
+}
+
+# Title of the current list/note, cleaned like the item scopes of the catalog
+_keepcli_current() {
+    _keepcli_catalog current
+}
+
+# _keepcli_reply <head> <partial> : adds <head><value> for every value on stdin
+# starting with <partial>. It must not run in a pipeline, which would be a subshell
+_keepcli_reply() {
+    local value
+    while IFS= read -r value; do
+        case "$value" in
+            "$2"*) COMPREPLY+=("$1$value") ;;
+        esac
+    done
+}
+
+_keepcli() {
+    local cur prev line cmd rest flag head
+    cur="$2"
+    prev="${COMP_WORDS[COMP_CWORD-1]}"
+    COMPREPLY=()
+    if [ "$prev" != "-c" ] && [ "$prev" != "--command" ]; then
+        COMPREPLY=($(compgen -W "-h --help -v --version -o --offline -c --command --completion" -- "$cur"))
+        return 0
+    fi
+    line="$cur"
+    cmd="${line%% *}"
+    if [ "$cmd" = "$line" ]; then
+        _keepcli_reply "" "$line" < <(_keepcli_catalog command)
+        return 0
+    fi
+    rest="${line#* }"
+    flag=""
+    case "$rest" in
+        *--list\ *) flag="--list" ;;
+        *--under\ *) flag="--under" ;;
+        *--label\ *) flag="--label" ;;
+        *--color\ *) flag="--color" ;;
+    esac
+    if [ -n "$flag" ]; then
+        rest="${rest##*$flag }"
+    fi
+    head="${line%"$rest"}"
+    case "$cmd:$flag" in
+        ul:|useList:|*:--list)
+            _keepcli_reply "$head" "$rest" < <(_keepcli_catalog list) ;;
+        un:|useNote:)
+            _keepcli_reply "$head" "$rest" < <(_keepcli_catalog note) ;;
+        show:|delete:)
+            _keepcli_reply "$head" "$rest" < <(_keepcli_catalog list; _keepcli_catalog note) ;;
+        *:--label)
+            _keepcli_reply "$head" "$rest" < <(_keepcli_catalog label) ;;
+        *:--color)
+            _keepcli_reply "$head" "$rest" < <(_keepcli_catalog option color) ;;
+        ai:*|addItem:*|checkItem:|uncheckItem:|deleteItem:|moveItem:|remind:|indentItem:*|dedentItem:)
+            _keepcli_reply "$head" "$rest" < <(_keepcli_catalog item "$(_keepcli_current)") ;;
+        label:)
+            case "$rest" in
+                add\ *|remove\ *)
+                    head="$head${rest%% *} "
+                    _keepcli_reply "$head" "${rest#* }" < <(_keepcli_catalog label) ;;
+                *)
+                    _keepcli_reply "$head" "$rest" < <(_keepcli_catalog option label) ;;
+            esac ;;
+        *)
+            _keepcli_reply "$head" "$rest" < <(_keepcli_catalog option "$cmd") ;;
+    esac
+    return 0
+}
+
+if [ -n "$ZSH_VERSION" ]; then
+    autoload -U +X bashcompinit && bashcompinit
+fi
+complete -F _keepcli keepcli
@@ -0,0 +1,179 @@
+"""Content addressed, size bounded LRU disk cache for note images, drawings and audio"""
+import os
+import time
+import asyncio
+import hashlib
+import mimetypes
+import requests
+import yaml
+from keepcli.filelock import FileLock, replace_atomic
+
+MEDIA_DIR = 'media'
+INDEX_FILE = 'index.yaml'
+
+
+def download(url, timeout=60):
+    """
+    Downloads a media link
+
+    Returns
+    -------
+    tuple
+        (content bytes, content type)
+    """
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.content, response.headers.get('Content-Type', '')
+
+
+async def fetch_blobs(aio, blobs):
+    """
+    Resolves media links and downloads several blobs concurrently on the AsyncKeep pool
+
+    Parameters
+    ----------
+    aio : keepcli.aiokeep.AsyncKeep
+        The async client
+    blobs : list of gkeepapi.node.Blob
+        Attachments to download
+
+    Returns
+    -------
+    list
+        (content bytes, content type) or the exception raised, for every blob in order
+    """
+    async def fetch(blob):
+        url = await aio.media_link(blob)
+        return await aio.call(download, url)
+    return await asyncio.gather(*[fetch(blob) for blob in blobs], return_exceptions=True)
+
+
+def describe(blob):
+    """ Short description of an attachment"""
+    kind = blob.blob.type.name if blob.blob is not None else 'Blob'
+    text = getattr(blob.blob, 'extracted_text', '') or ''
+    return '{}{}'.format(kind, ' ({})'.format(text[:30]) if text else '')
+
+
+class MediaCache(object):
+    """
+    Disk cache for attachments. Files are stored once per content hash under
+    objects/<hash[:2]>/<hash><ext>, an index maps blob ids to hashes and keeps sizes and
+    last access times so the least recently used objects are evicted past max_bytes.
+    The index is read and updated under its lock, objects cached by another keepcli
+    process in the meantime are kept.
+
+    Parameters
+    ----------
+    root : str
+        Cache directory, e.g. ~/.keepcli/media
+    max_bytes : int, optional
+        Size bound of the cache
+    """
+    def __init__(self, root, max_bytes=200 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.removed = set()
+        self.index_file = os.path.join(root, INDEX_FILE)
+        data = {}
+        if os.path.exists(self.index_file):
+            with FileLock(self.index_file, shared=True):
+                data = self._read()
+        self.keys = data.get('keys', {})
+        self.objects = data.get('objects', {})
+
+    def _read(self):
+        if not os.path.exists(self.index_file):
+            return {}
+        with open(self.index_file, 'r') as index:
+            return yaml.safe_load(index) or {}
+
+    def save(self):
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+        with FileLock(self.index_file):
+            data = self._read()
+            objects = data.get('objects', {})
+            for content_hash, obj in self.objects.items():
+                if content_hash in objects:
+                    obj['atime'] = max(obj['atime'], objects[content_hash]['atime'])
+            objects.update(self.objects)
+            for content_hash in self.removed:
+                objects.pop(content_hash, None)
+            keys = data.get('keys', {})
+            keys.update(self.keys)
+            self.objects = objects
+            self.keys = dict((k, h) for k, h in keys.items() if h in objects)
+            self.removed = set()
+            replace_atomic(self.index_file, yaml.safe_dump(
+                {'keys': self.keys, 'objects': self.objects},
+                default_flow_style=False).encode('utf-8'))
+
+    def size(self):
+        return sum(obj['size'] for obj in self.objects.values())
+
+    def _object_path(self, content_hash):
+        return os.path.join(self.root, 'objects', content_hash[:2],
+                            content_hash + self.objects[content_hash]['ext'])
+
+    def get(self, key):
+        """
+        Returns the cached file for a blob id and marks it as used, None if not cached
+        """
+        content_hash = self.keys.get(key)
+        if content_hash is None or content_hash not in self.objects:
+            return None
+        path = self._object_path(content_hash)
+        if not os.path.exists(path):
+            del self.objects[content_hash]
+            self.removed.add(content_hash)
+            return None
+        self.objects[content_hash]['atime'] = time.time()
+        return path
+
+    def put(self, key, data, content_type=''):
+        """
+        Stores the content of a blob, identical content is only stored once.
+        Returns the cached file.
+        """
+        content_hash = hashlib.sha256(data).hexdigest()
+        if content_hash not in self.objects:
+            ext = mimetypes.guess_extension(content_type.split(';')[0].strip()) or ''
+            self.objects[content_hash] = {'size': len(data), 'ext': ext, 'atime': time.time()}
+            path = self._object_path(content_hash)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            replace_atomic(path, data)
+        self.keys[key] = content_hash
+        self.objects[content_hash]['atime'] = time.time()
+        self.removed.discard(content_hash)
+        self.evict(keep=content_hash)
+        return self._object_path(content_hash)
+
+    def evict(self, keep=None):
+        """
+        Removes least recently used objects until the cache fits in max_bytes
+        """
+        total = self.size()
+        if total <= self.max_bytes:
+            return
+        for content_hash in sorted(self.objects, key=lambda h: self.objects[h]['atime']):
+            if total <= self.max_bytes:
+                break
+            if content_hash == keep:
+                continue
+            path = self._object_path(content_hash)
+            if os.path.exists(path):
+                os.remove(path)
+            total -= self.objects.pop(content_hash)['size']
+            self.removed.add(content_hash)
+        self.keys = dict((k, h) for k, h in self.keys.items() if h in self.objects)
+
+    def clear(self):
+        for content_hash in list(self.objects):
+            path = self._object_path(content_hash)
+            if os.path.exists(path):
+                os.remove(path)
+        self.removed.update(self.objects)
+        self.keys = {}
+        self.objects = {}
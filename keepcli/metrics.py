@@ -0,0 +1,167 @@
+"""Session metrics written periodically as a Prometheus textfile (node_exporter textfile collector)"""
+import time
+import threading
+from contextlib import contextmanager
+from keepcli.filelock import replace_atomic
+
+METRICS_FILE = 'keepcli.prom'
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, escape(v)) for k, v in pairs) + '}'
+
+
+class Metrics(object):
+    """
+    Thread safe registry of counters, gauges and histograms, each identified by name and
+    a set of labels, rendered in the Prometheus text exposition format
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.meta = {}
+        self.values = {}
+
+    def declare(self, name, kind, text, buckets=BUCKETS):
+        """
+        Registers a metric
+
+        Parameters
+        ----------
+        name : str
+            Metric name, counters end in _total
+        kind : str
+            'counter', 'gauge' or 'histogram'
+        text : str
+            Help line
+        buckets : tuple, optional
+            Upper bounds of the histogram buckets, in seconds
+        """
+        self.meta[name] = (kind, text, buckets)
+        self.values.setdefault(name, {})
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[name][key] = value
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        buckets = self.meta[name][2]
+        with self.lock:
+            series = self.values[name]
+            if key not in series:
+                series[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            histogram = series[key]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """ Observes the time spent in the with block into a histogram"""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(name, time.time() - start, **labels)
+
+    def render(self):
+        """ All the metrics in the Prometheus text format"""
+        lines = []
+        with self.lock:
+            for name in sorted(self.meta):
+                kind, text, buckets = self.meta[name]
+                lines.append('# HELP {} {}'.format(name, text))
+                lines.append('# TYPE {} {}'.format(name, kind))
+                for labels, value in sorted(self.values[name].items()):
+                    if kind != 'histogram':
+                        lines.append('{}{} {}'.format(name, format_labels(labels), value))
+                        continue
+                    for bound, count in zip(buckets, value['buckets']):
+                        lines.append('{}_bucket{} {}'.format(
+                                     name, format_labels(labels, [('le', bound)]), count))
+                    lines.append('{}_bucket{} {}'.format(
+                                 name, format_labels(labels, [('le', '+Inf')]), value['count']))
+                    lines.append('{}_sum{} {}'.format(name, format_labels(labels), value['sum']))
+                    lines.append('{}_count{} {}'.format(name, format_labels(labels),
+                                                        value['count']))
+        return '\n'.join(lines) + '\n'
+
+
+def keepcli_metrics():
+    """ Registry with the metrics of a keepcli session declared"""
+    metrics = Metrics()
+    metrics.declare('keepcli_sync_duration_seconds', 'histogram', 'Time spent in Keep syncs')
+    metrics.declare('keepcli_sync_failures_total', 'counter', 'Syncs that raised an error')
+    metrics.declare('keepcli_refresh_rebuild_seconds', 'histogram',
+                    'Time spent rebuilding indexes, statistics and catalog after a refresh')
+    metrics.declare('keepcli_command_duration_seconds', 'histogram',
+                    'Time spent running shell commands')
+    metrics.declare('keepcli_entries', 'gauge', 'Active lists and notes')
+    metrics.declare('keepcli_items', 'gauge', 'Items of the active lists')
+    metrics.declare('keepcli_pending_writes', 'gauge',
+                    'Entries with changes not synced yet, as of the last refresh')
+    metrics.declare('keepcli_start_time_seconds', 'gauge', 'Session start, unix time')
+    metrics.set('keepcli_start_time_seconds', time.time())
+    metrics.inc('keepcli_sync_failures_total', 0)
+    return metrics
+
+
+class MetricsWriter(object):
+    """
+    Writes the metrics to a textfile every `interval` seconds on a background thread and
+    once more on close. Files are replaced atomically so the collector never reads a
+    partial file.
+
+    Parameters
+    ----------
+    metrics : Metrics
+        What to write
+    path : str
+        Output file, it should end in .prom and live in the collector directory
+    interval : float, optional
+        Seconds between two writes
+    """
+    def __init__(self, metrics, path, interval=15):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.timer = None
+
+    def write(self):
+        replace_atomic(self.path, self.metrics.render().encode('utf-8'))
+
+    def _tick(self):
+        try:
+            self.write()
+        except (IOError, OSError):
+            pass
+        if self.timer is not None:
+            self.start()
+
+    def start(self):
+        self.timer = threading.Timer(self.interval, self._tick)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def close(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+            self.write()
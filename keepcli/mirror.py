@@ -0,0 +1,340 @@
+"""Incremental two-way mirror between Keep entries and local todo.txt / Markdown files"""
+import os
+import re
+import hashlib
+import yaml
+from keepcli.tree import ItemTree, node_version
+from keepcli.filelock import FileLock, replace_atomic
+
+MIRROR_FILE = 'mirror.yaml'
+
+
+def digest(text):
+    """ Content hash used to tell whether a file really changed"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def file_name(node):
+    """ Default local file for an entry, todo.txt style for lists and Markdown for notes"""
+    name = re.sub(r'[^\w\-. ]+', '_', node.title).strip() or node.id
+    return name + ('.txt' if node.type.name == 'List' else '.md')
+
+
+def render_list(List):
+    """
+    Renders a list as todo.txt lines, checked items start with 'x ' and sub-items
+    are indented with two spaces
+    """
+    tree = ItemTree(List.items, keep_order=True)
+    lines = []
+    for depth, item in tree.walk():
+        lines.append('{}{}{}'.format('  ' * depth, 'x ' if item.checked else '', item.text))
+    return '\n'.join(lines) + '\n'
+
+
+def parse_list(text):
+    """
+    Parses todo.txt lines as written by render_list
+
+    Returns
+    -------
+    list of tuple
+        (depth, checked, text) for every non empty line
+    """
+    items = []
+    for line in text.splitlines():
+        if line.strip() == '':
+            continue
+        depth = 1 if line.startswith((' ', '\t')) else 0
+        line = line.strip()
+        checked = line.startswith('x ')
+        items.append((depth, checked, line[2:] if checked else line))
+    return items
+
+
+def render_note(Note):
+    """ Renders a note as Markdown with its title as header"""
+    return '# {}\n\n{}\n'.format(Note.title, Note.text)
+
+
+def render(node):
+    """ Local file content of a list or a note"""
+    return render_list(node) if node.type.name == 'List' else render_note(node)
+
+
+def parse_note(text):
+    """
+    Parses Markdown as written by render_note
+
+    Returns
+    -------
+    tuple
+        (title or None if there is no header, text)
+    """
+    lines = text.splitlines()
+    if lines and lines[0].startswith('# '):
+        title = lines[0][2:].strip()
+        lines = lines[1:]
+        if lines and lines[0] == '':
+            lines = lines[1:]
+        return title, '\n'.join(lines).rstrip('\n')
+    return None, text.rstrip('\n')
+
+
+def longest_ordered(values):
+    """
+    Positions of a longest strictly decreasing subsequence of values, O(n log n)
+    """
+    tails = []
+    tails_pos = []
+    previous = [-1] * len(values)
+    for pos, value in enumerate(values):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if tails[mid] > value:
+                lo = mid + 1
+            else:
+                hi = mid
+        previous[pos] = tails_pos[lo - 1] if lo > 0 else -1
+        if lo == len(tails):
+            tails.append(value)
+            tails_pos.append(pos)
+        else:
+            tails[lo] = value
+            tails_pos[lo] = pos
+    keep = set()
+    pos = tails_pos[-1] if tails_pos else -1
+    while pos != -1:
+        keep.add(pos)
+        pos = previous[pos]
+    return keep
+
+
+def reorder(items, delta=10000):
+    """
+    Gives items Keep's order (decreasing sort values) in the given sequence touching as
+    few items as possible: the longest run already in order keeps its sort values and
+    the others get values in the gaps between them, everything is renumbered only when
+    a gap is too small.
+
+    Parameters
+    ----------
+    items : list of gkeepapi.node.ListItem
+        Items in the desired order
+    delta : int, optional
+        Spacing used for new sort values
+
+    Returns
+    -------
+    int
+        Number of items whose sort value changed
+    """
+    values = [int(item.sort) for item in items]
+    fixed = sorted(longest_ordered(values))
+    if len(fixed) == len(items):
+        return 0
+    new = list(values)
+    bounds = [-1] + fixed + [len(items)]
+    for left, right in zip(bounds[:-1], bounds[1:]):
+        count = right - left - 1
+        if count == 0:
+            continue
+        high = values[left] if left >= 0 else None
+        low = values[right] if right < len(items) else None
+        if high is None and low is None:
+            high, low = delta * (count + 1), 0
+        elif high is None:
+            high = low + delta * (count + 1)
+        elif low is None:
+            low = high - delta * (count + 1)
+        step = (high - low) // (count + 1)
+        if step == 0:
+            new = [delta * (len(items) - pos) for pos in range(len(items))]
+            break
+        for pos in range(left + 1, right):
+            new[pos] = high - step * (pos - left)
+    changes = 0
+    for item, old, value in zip(items, values, new):
+        if old != value:
+            item.sort = value
+            changes += 1
+    return changes
+
+
+def apply_list(List, items):
+    """
+    Applies parsed todo.txt lines to a list with the fewest item operations: items are
+    matched by text, only state changes, additions, deletions, indentation and order
+    changes touch Keep. No sync is done here.
+
+    Parameters
+    ----------
+    List : gkeepapi.node.List
+        Target list
+    items : list of tuple
+        (depth, checked, text) as returned by parse_list
+
+    Returns
+    -------
+    int
+        Number of item operations applied
+    """
+    existing = {}
+    for item in List.items:
+        existing.setdefault(item.text, []).append(item)
+    changes = 0
+    kept = set()
+    parent = None
+    groups = {None: []}
+    for depth, checked, text in items:
+        matches = existing.get(text)
+        if matches:
+            item = matches.pop(0)
+        else:
+            item = List.add(text, checked)
+            changes += 1
+        kept.add(item.id)
+        if item.checked != checked:
+            item.checked = checked
+            changes += 1
+        if depth == 0 or parent is None:
+            if item.super_list_item_id and item.parent_item is not None:
+                item.parent_item.dedent(item)
+                changes += 1
+            parent = item
+            groups[None].append(item)
+            groups[item.id] = []
+        else:
+            if item.super_list_item_id != parent.id and not item.subitems:
+                if item.parent_item is not None:
+                    item.parent_item.dedent(item)
+                parent.indent(item)
+                changes += 1
+            groups[parent.id].append(item)
+    for item in List.items:
+        if item.id not in kept:
+            item.delete()
+            changes += 1
+    for group in groups.values():
+        changes += reorder(group)
+    return changes
+
+
+class Mirror(object):
+    """
+    Mapping of Keep entries to local files plus the state recorded at the last mirror run:
+    file mtime and content hash on the local side, node_version on the Keep side.
+    Only entries whose side moved since then are read, written or pushed. The state file
+    is read and updated under its lock, entries saved by another keepcli process in the
+    meantime are kept.
+
+    Parameters
+    ----------
+    state_file : str
+        Yaml file where the mapping and state are stored
+    directory : str
+        Default directory for mirrored files
+    """
+    def __init__(self, state_file, directory):
+        self.state_file = state_file
+        self.directory = directory
+        self.removed = set()
+        with FileLock(state_file, shared=True):
+            data = self._read()
+        self.directory = data.get('directory', directory)
+        self.entries = data.get('entries', {})
+
+    def _read(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        with open(self.state_file, 'r') as state:
+            return yaml.safe_load(state) or {}
+
+    def save(self):
+        with FileLock(self.state_file):
+            entries = self._read().get('entries', {})
+            entries.update(self.entries)
+            for node_id in self.removed:
+                entries.pop(node_id, None)
+            self.entries = entries
+            self.removed = set()
+            replace_atomic(self.state_file, yaml.safe_dump(
+                {'directory': self.directory, 'entries': self.entries},
+                default_flow_style=False).encode('utf-8'))
+
+    def path(self, node_id):
+        return os.path.join(self.directory, self.entries[node_id]['file'])
+
+    def add(self, node, filename=None):
+        self.removed.discard(node.id)
+        self.entries[node.id] = {'file': filename or file_name(node), 'title': node.title,
+                                 'hash': None, 'mtime': None, 'version': None}
+
+    def remove(self, node_id):
+        self.entries.pop(node_id, None)
+        self.removed.add(node_id)
+
+    def local_change(self, node_id):
+        """
+        Returns the new file content if the file changed since the last run, else None.
+        The file is only read when its mtime moved. A file that already existed before the
+        first run is returned as changed, it was never mirrored.
+        """
+        state = self.entries[node_id]
+        path = self.path(node_id)
+        if not os.path.exists(path):
+            return None
+        if state['hash'] is None:
+            with open(path, 'r') as local:
+                return local.read()
+        if os.stat(path).st_mtime == state['mtime']:
+            return None
+        with open(path, 'r') as local:
+            text = local.read()
+        if digest(text) == state['hash']:
+            state['mtime'] = os.stat(path).st_mtime
+            return None
+        return text
+
+    def remote_changed(self, node_id, node):
+        return node_version(node) != self.entries[node_id]['version']
+
+    def push(self, node, text):
+        """
+        Applies a local file content to its entry, returns the number of changes
+        """
+        if node.type.name == 'List':
+            return apply_list(node, parse_list(text))
+        title, body = parse_note(text)
+        changes = 0
+        if title is not None and title != node.title:
+            node.title = title
+            changes += 1
+        if body != node.text:
+            node.text = body
+            changes += 1
+        return changes
+
+    def pull(self, node, local_text=None):
+        """
+        Writes an entry to its file unless the file already has that content, and records
+        the state. local_text is the current file content when it is already known.
+        Returns True if the file was written.
+        """
+        state = self.entries[node.id]
+        path = self.path(node.id)
+        text = render(node)
+        new_hash = digest(text)
+        on_disk = state['hash'] if local_text is None else digest(local_text)
+        written = False
+        if new_hash != on_disk or not os.path.exists(path):
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            replace_atomic(path, text.encode('utf-8'))
+            written = True
+        state['hash'] = new_hash
+        state['mtime'] = os.stat(path).st_mtime
+        state['version'] = node_version(node)
+        state['title'] = node.title
+        return written
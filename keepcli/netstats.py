@@ -0,0 +1,128 @@
+"""Pooled keep-alive HTTP sessions for gkeepapi with per-endpoint request statistics"""
+import re
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from keepcli.aiokeep import WORKERS
+
+POOL_SIZE = WORKERS
+TIMEOUT = (10, 60)
+CONNECT_RETRIES = 2
+API_ATTRIBUTES = ('_keep_api', '_media_api', '_reminders_api')
+ID_RE = re.compile(r'^[\w.-]{20,}$|^\d+$')
+
+
+def endpoint(method, url):
+    """
+    Groups requests by method and path, ids in the path are collapsed so every media
+    download counts under the same endpoint
+    """
+    path = requests.utils.urlparse(url).path
+    parts = ['{id}' if ID_RE.match(part) else part for part in path.split('/')]
+    return '{} {}'.format(method.upper(), '/'.join(parts))
+
+
+class NetStats(object):
+    """
+    Thread safe per-endpoint counters: requests, errors (exceptions and HTTP >= 400),
+    connection retries, response bytes and time spent
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.since = time.time()
+
+    def record(self, name, seconds, size=0, retries=0, error=False):
+        with self.lock:
+            entry = self.endpoints.setdefault(name, {'requests': 0, 'errors': 0, 'retries': 0,
+                                                     'bytes': 0, 'seconds': 0.0, 'max': 0.0})
+            entry['requests'] += 1
+            entry['errors'] += 1 if error else 0
+            entry['retries'] += retries
+            entry['bytes'] += size
+            entry['seconds'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+            self.since = time.time()
+
+    def as_dict(self):
+        """ Copy of the counters with the average time per request added"""
+        with self.lock:
+            result = {}
+            for name, entry in self.endpoints.items():
+                entry = dict(entry)
+                entry['avg'] = entry['seconds'] / entry['requests']
+                result[name] = entry
+            return result
+
+
+class PooledSession(requests.Session):
+    """
+    requests.Session with a bounded keep-alive connection pool, default timeouts,
+    retries of failed connections (a request that never reached the server) and
+    timing of every request into NetStats
+
+    Parameters
+    ----------
+    stats : NetStats
+        Where requests are recorded
+    pool_size : int, optional
+        Connections kept alive per host, the AsyncKeep workers by default since
+        no more requests than that run at the same time
+    timeout : tuple, optional
+        (connect, read) timeout in seconds, used when a request does not give one
+    check : callable, optional
+        Called before every request, it may raise to stop the request from being sent
+        (AsyncKeep.check_cancelled)
+    """
+    def __init__(self, stats, pool_size=POOL_SIZE, timeout=TIMEOUT, check=None):
+        requests.Session.__init__(self)
+        self.stats = stats
+        self.timeout = timeout
+        self.check = check
+        retry = Retry(total=CONNECT_RETRIES, connect=CONNECT_RETRIES, read=0, status=0,
+                      backoff_factor=0.5)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                              max_retries=retry)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        if self.check is not None:
+            self.check()
+        kwargs.setdefault('timeout', self.timeout)
+        name = endpoint(method, url)
+        start = time.time()
+        try:
+            response = requests.Session.request(self, method, url, *args, **kwargs)
+        except requests.exceptions.RequestException:
+            self.stats.record(name, time.time() - start, error=True)
+            raise
+        retries = getattr(response.raw, 'retries', None)
+        self.stats.record(name, time.time() - start, size=len(response.content),
+                          retries=len(retries.history) if retries is not None else 0,
+                          error=response.status_code >= 400)
+        return response
+
+
+def pool_keep(keep, stats, pool_size=POOL_SIZE, timeout=TIMEOUT, check=None):
+    """
+    Replaces the sessions of the gkeepapi API clients of keep with PooledSessions, one
+    per API so each keeps its connections to its host alive. Headers are carried over.
+    Login goes through gpsoauth and is not covered.
+    """
+    for attribute in API_ATTRIBUTES:
+        api = getattr(keep, attribute, None)
+        if api is None or getattr(getattr(api, '_session', None), 'stats', None) is stats:
+            continue
+        session = PooledSession(stats, pool_size, timeout, check)
+        old = getattr(api, '_session', None)
+        if old is not None:
+            session.headers.update(old.headers)
+            old.close()
+        api._session = session
@@ -0,0 +1,302 @@
+"""Record gkeepapi traffic once and replay it offline, to time keepcli sessions without Google.
+
+Set KEEPCLI_RECORD=<file> to record a session, then KEEPCLI_REPLAY=<file> to replay it.
+KEEPCLI_REPLAY_LATENCY sets a fixed latency per request in seconds (recorded times are
+used by default) and KEEPCLI_REPLAY_SCALE multiplies the nodes of every sync response.
+A replayed session logs in as REPLAY_USER, no auth file or credentials are needed."""
+import os
+import re
+import copy
+import atexit
+import json
+import time
+import threading
+import requests
+import gkeepapi
+from requests.adapters import BaseAdapter, HTTPAdapter
+from keepcli.netstats import API_ATTRIBUTES, endpoint
+from keepcli.filelock import write_locked
+
+SECRET_RE = re.compile(r'token|auth|passw|email|cookie|secret', re.IGNORECASE)
+SCRUBBED = 'SCRUBBED'
+REPLAY_USER = 'replay@example.com'
+ID_KEYS = ('id', 'serverId', 'parentId', 'parentServerId', 'superListItemId')
+
+
+def scrub(data):
+    """
+    Copy of a json document with the values of secret looking keys replaced
+    """
+    if isinstance(data, dict):
+        return dict((key, SCRUBBED if SECRET_RE.search(key) else scrub(value))
+                    for key, value in data.items())
+    if isinstance(data, list):
+        return [scrub(value) for value in data]
+    return data
+
+
+def scale_nodes(body, factor):
+    """
+    Multiplies the nodes of a sync response: every copy gets its ids suffixed, parents
+    included, so copies form whole new entries and parsing cost grows with the factor
+    """
+    if factor <= 1 or not body.get('nodes'):
+        return body
+    nodes = list(body['nodes'])
+    for copy_number in range(1, factor):
+        for node in body['nodes']:
+            node = dict(node)
+            for key in ID_KEYS:
+                if node.get(key) and node[key] != 'root':
+                    node[key] = '{}~{}'.format(node[key], copy_number)
+            nodes.append(node)
+    body = dict(body)
+    body['nodes'] = nodes
+    return body
+
+
+def json_body(data):
+    if not data:
+        return None
+    try:
+        return json.loads(data)
+    except (TypeError, ValueError):
+        return None
+
+
+class Cassette(object):
+    """
+    Recorded interactions grouped by endpoint ('METHOD /path', or 'login'), each with the
+    scrubbed request and response bodies, status and the time it took
+
+    Parameters
+    ----------
+    path : str
+        The json file holding the recording
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.interactions = []
+
+    def load(self):
+        with open(self.path, 'r') as stream:
+            self.interactions = json.load(stream)['interactions']
+        return self
+
+    def save(self):
+        with self.lock:
+            data = json.dumps({'version': 1, 'interactions': self.interactions})
+        write_locked(self.path, data.encode('utf-8'))
+
+    def add(self, interaction):
+        with self.lock:
+            self.interactions.append(interaction)
+
+
+class RecordingAdapter(BaseAdapter):
+    """
+    Transport adapter wrapping the one already mounted: requests are sent by it, so its
+    connection pool and retries are kept, and recorded
+    """
+    def __init__(self, cassette, adapter):
+        BaseAdapter.__init__(self)
+        self.cassette = cassette
+        self.adapter = adapter
+
+    def send(self, request, *args, **kwargs):
+        start = time.time()
+        response = self.adapter.send(request, *args, **kwargs)
+        body = json_body(response.content)
+        self.cassette.add({'endpoint': endpoint(request.method, request.url),
+                           'request': scrub(json_body(request.body)),
+                           'status': response.status_code,
+                           'response': scrub(body) if body is not None else None,
+                           'seconds': time.time() - start})
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+
+class ReplayAdapter(HTTPAdapter):
+    """
+    Transport adapter answering from a cassette, in recorded order per endpoint. When an
+    endpoint runs out the last sync response is repeated without nodes, i.e. the server
+    has nothing new, so any number of refreshes can be replayed.
+    """
+    def __init__(self, replayer):
+        HTTPAdapter.__init__(self)
+        self.replayer = replayer
+
+    def send(self, request, *args, **kwargs):
+        name = endpoint(request.method, request.url)
+        interaction = self.replayer.next(name)
+        if interaction is None:
+            raise requests.exceptions.ConnectionError(
+                'No recorded response for {}'.format(name), request=request)
+        self.replayer.wait(interaction)
+        body = interaction['response']
+        if isinstance(body, dict):
+            body = scale_nodes(body, self.replayer.scale)
+        response = requests.Response()
+        response.status_code = interaction['status']
+        response.headers['Content-Type'] = 'application/json'
+        response._content = json.dumps(body).encode('utf-8')
+        response.url = request.url
+        response.request = request
+        response.reason = 'Replayed'
+        return response
+
+
+class Recorder(object):
+    """
+    Records the Keep traffic of the clients it is attached to, and the login time, into
+    a cassette written on close, at the latest when the interpreter exits
+
+    Parameters
+    ----------
+    path : str
+        Cassette file to write
+    """
+    def __init__(self, path):
+        self.cassette = Cassette(path)
+        self.login = gkeepapi.APIAuth.login
+        self.closed = False
+        recorder = self
+
+        def login(auth, *args, **kwargs):
+            start = time.time()
+            try:
+                return recorder.login(auth, *args, **kwargs)
+            finally:
+                recorder.cassette.add({'endpoint': 'login', 'request': None, 'status': 200,
+                                       'response': None, 'seconds': time.time() - start})
+        gkeepapi.APIAuth.login = login
+        atexit.register(self.close)
+
+    def attach(self, keep):
+        for attribute in API_ATTRIBUTES:
+            api = getattr(keep, attribute, None)
+            if api is None:
+                continue
+            for prefix in ('https://', 'http://'):
+                adapter = api._session.get_adapter(prefix)
+                if not isinstance(adapter, RecordingAdapter):
+                    api._session.mount(prefix, RecordingAdapter(self.cassette, adapter))
+
+    def close(self):
+        """ Restores the login and writes the cassette, only the first call does anything"""
+        if self.closed:
+            return
+        self.closed = True
+        gkeepapi.APIAuth.login = self.login
+        self.cassette.save()
+
+
+class Replayer(object):
+    """
+    Serves the Keep endpoints and login from a cassette, no network is used. Replies are
+    deterministic: same cassette, same answers in the same order. The patched login is
+    restored on close, at the latest when the interpreter exits.
+
+    Parameters
+    ----------
+    path : str
+        Cassette to replay
+    latency : float, optional
+        Fixed seconds per request, the recorded time when None
+    speed : float, optional
+        Recorded times are divided by speed (ignored with a fixed latency)
+    scale : int, optional
+        Nodes of sync responses are multiplied by scale
+    sleep : callable, optional
+        Used to wait, time.sleep by default
+    """
+    def __init__(self, path, latency=None, speed=1.0, scale=1, sleep=time.sleep):
+        self.cassette = Cassette(path).load()
+        self.latency = latency
+        self.speed = speed
+        self.scale = scale
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.queues = {}
+        self.last = {}
+        for interaction in self.cassette.interactions:
+            self.queues.setdefault(interaction['endpoint'], []).append(interaction)
+        for queue in self.queues.values():
+            queue.reverse()
+        self.user = REPLAY_USER
+        self.closed = False
+        self.saved = (gkeepapi.APIAuth.login, gkeepapi.APIAuth.refresh)
+        replayer = self
+
+        def login(auth, email, password, device_id=None):
+            interaction = replayer.next('login')
+            if interaction is not None:
+                replayer.wait(interaction)
+            auth._email = email
+            auth._device_id = device_id
+            auth._master_token = SCRUBBED
+            auth._auth_token = SCRUBBED
+            return True
+
+        def refresh(auth):
+            auth._auth_token = SCRUBBED
+            return auth._auth_token
+        gkeepapi.APIAuth.login = login
+        gkeepapi.APIAuth.refresh = refresh
+        atexit.register(self.close)
+
+    def next(self, name):
+        """
+        Next recorded interaction for an endpoint, an empty sync once it ran out
+        """
+        with self.lock:
+            queue = self.queues.get(name)
+            if queue:
+                self.last[name] = queue[-1]
+                return queue.pop()
+            last = self.last.get(name)
+            if last is None or not isinstance(last['response'], dict):
+                return last
+            idle = copy.deepcopy(last)
+            idle['response'].pop('nodes', None)
+            idle['response']['truncated'] = False
+            return idle
+
+    def wait(self, interaction):
+        seconds = self.latency
+        if seconds is None:
+            seconds = interaction['seconds'] / self.speed
+        if seconds > 0:
+            self.sleep(seconds)
+
+    def attach(self, keep):
+        for attribute in API_ATTRIBUTES:
+            api = getattr(keep, attribute, None)
+            if api is not None:
+                adapter = ReplayAdapter(self)
+                api._session.mount('https://', adapter)
+                api._session.mount('http://', adapter)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        gkeepapi.APIAuth.login, gkeepapi.APIAuth.refresh = self.saved
+
+
+def from_environment(environ=None):
+    """
+    Recorder or Replayer configured from KEEPCLI_RECORD / KEEPCLI_REPLAY, None if unset
+    """
+    environ = os.environ if environ is None else environ
+    if environ.get('KEEPCLI_REPLAY'):
+        latency = environ.get('KEEPCLI_REPLAY_LATENCY')
+        return Replayer(environ['KEEPCLI_REPLAY'],
+                        latency=float(latency) if latency else None,
+                        scale=int(environ.get('KEEPCLI_REPLAY_SCALE', 1)))
+    if environ.get('KEEPCLI_RECORD'):
+        return Recorder(environ['KEEPCLI_RECORD'])
+    return None
@@ -0,0 +1,153 @@
+"""Adaptive sync scheduling: learns how often the server has changes and backs off when idle"""
+import time
+import random
+import threading
+import requests
+import gkeepapi
+from keepcli.aiokeep import Cancelled
+
+
+def is_transient(error):
+    """
+    Whether a sync error is worth retrying: network errors, rate limits and server errors
+    """
+    if isinstance(error, requests.exceptions.RequestException):
+        return True
+    if isinstance(error, gkeepapi.exception.APIException):
+        code = getattr(error, 'code', None)
+        return code is None or code == 429 or code >= 500
+    return False
+
+
+class SyncScheduler(object):
+    """
+    Decides when to sync. Every sync reports whether the server sent changes: the
+    background interval halves when it did and doubles when it did not, between
+    min_interval and max_interval, with +-20% jitter. Local edits (activity) bring the next
+    sync down to `active` seconds so a burst of edits goes up in a single sync.
+    A user triggered sync right after another one with nothing to push is coalesced, and
+    transient errors are retried with exponential backoff; a failed background sync is
+    retried at the next, further away, due time.
+
+    Parameters
+    ----------
+    sync : callable
+        Runs one blocking sync and returns True if the server sent changes
+    pending : callable
+        Returns True if there are local changes waiting to be synced
+    min_interval, max_interval : float, optional
+        Bounds of the background interval in seconds
+    active : float, optional
+        Delay of the sync following local edits
+    retries : int, optional
+        Retries of a transiently failing sync
+    coalesce : float, optional
+        A user sync within these seconds of the last one, with nothing pending, is skipped
+    """
+    def __init__(self, sync, pending, min_interval=60, max_interval=1800, active=10,
+                 retries=3, coalesce=5):
+        self._sync = sync
+        self.pending = pending
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.active = active
+        self.retries = retries
+        self.coalesce = coalesce
+        self.interval = min_interval
+        self.lock = threading.Lock()
+        self.last = 0
+        self.due = time.time() + self.interval
+        self.syncs = 0
+        self.changes = 0
+        self.changed = False
+        self.failures = 0
+        self.last_error = None
+        self.timer = None
+
+    def jitter(self, seconds):
+        return seconds * random.uniform(0.8, 1.2)
+
+    def learn(self, changed):
+        """ Adapts the background interval to the last sync result"""
+        self.syncs += 1
+        self.changed = changed
+        if changed:
+            self.changes += 1
+            self.interval = max(self.min_interval, self.interval / 2.0)
+        else:
+            self.interval = min(self.max_interval, self.interval * 2.0)
+        self.last = time.time()
+        self.due = self.last + self.jitter(self.interval)
+
+    def activity(self):
+        """ Local edits were made, sync them soon"""
+        self.interval = self.min_interval
+        self.due = min(self.due, time.time() + self.active)
+
+    def run(self, retries=None, sleep=time.sleep):
+        """
+        Runs a sync now, retrying transient errors with exponential backoff and jitter.
+        A sync already in flight is waited for, and when it succeeded and there is nothing
+        left to push its result is returned instead of syncing a second time.
+
+        Parameters
+        ----------
+        retries : int, optional
+            Overrides the number of retries, e.g. 0 for background syncs
+
+        Returns
+        -------
+        bool
+            Whether the server sent changes
+
+        Raises
+        ------
+        Exception
+            The last error once retries are exhausted, or a non transient error
+        """
+        retries = self.retries if retries is None else retries
+        syncs = self.syncs
+        with self.lock:
+            if self.syncs != syncs and not self.pending():
+                return self.changed
+            for attempt in range(retries + 1):
+                try:
+                    changed = self._sync()
+                except Cancelled:
+                    raise
+                except Exception as e:
+                    self.failures += 1
+                    self.last_error = e
+                    if attempt == retries or not is_transient(e):
+                        self.interval = min(self.max_interval, self.interval * 2)
+                        self.due = time.time() + self.jitter(self.interval)
+                        raise
+                    sleep(self.jitter(2 ** attempt))
+                    continue
+                self.last_error = None
+                self.learn(changed)
+                return changed
+
+    def request(self):
+        """
+        User triggered sync. Returns None when coalesced with a sync that just finished,
+        else whether the server sent changes.
+        """
+        if not self.pending() and time.time() - self.last < self.coalesce:
+            return None
+        return self.run()
+
+    def seconds_left(self):
+        return max(0, self.due - time.time())
+
+    def schedule(self, job):
+        """ (Re)starts the countdown to the next background sync, job runs on a timer thread"""
+        self.stop()
+        self.timer = threading.Timer(self.seconds_left(), job)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
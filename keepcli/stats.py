@@ -0,0 +1,121 @@
+"""Account statistics kept up to date incrementally as entries change"""
+from collections import Counter
+from keepcli.tree import node_version
+
+
+def list_counts(List):
+    """
+    Counters contributed by a single list
+
+    Returns
+    -------
+    dict
+        items, checked, and items created / completed per day (YYYY-MM-DD). Keep does not
+        record when an item was checked, its last update is used as completion day
+    """
+    items = checked = 0
+    created = Counter()
+    completed = Counter()
+    for item in List.children:
+        if item.type.name != 'ListItem' or item.deleted:
+            continue
+        items += 1
+        created[item.timestamps.created.date().isoformat()] += 1
+        if item.checked:
+            checked += 1
+            completed[item.timestamps.updated.date().isoformat()] += 1
+    return {'items': items, 'checked': checked, 'created': created, 'completed': completed}
+
+
+class Stats(object):
+    """
+    Totals per list, per color and per label plus items created and completed per day.
+    Each list contribution is cached with its node version: on update only the lists that
+    changed are counted again and their old contribution is swapped for the new one.
+    """
+    def __init__(self):
+        self.lists = {}
+        self.notes = 0
+        self.by_color = {}
+        self.by_label = {}
+        self.created = Counter()
+        self.completed = Counter()
+        self.items = 0
+        self.checked = 0
+
+    def _apply(self, entry, sign):
+        counts = entry['counts']
+        self.items += sign * counts['items']
+        self.checked += sign * counts['checked']
+        if sign > 0:
+            self.created.update(counts['created'])
+            self.completed.update(counts['completed'])
+        else:
+            self.created.subtract(counts['created'])
+            self.completed.subtract(counts['completed'])
+        groups = [self.by_color.setdefault(entry['color'], Counter())]
+        groups += [self.by_label.setdefault(label, Counter()) for label in entry['labels']]
+        for group in groups:
+            group['lists'] += sign
+            group['items'] += sign * counts['items']
+            group['checked'] += sign * counts['checked']
+
+    def update_list(self, List):
+        """
+        Recounts a list if its version, title, color or labels changed since the last update
+        """
+        entry = {'version': node_version(List), 'title': List.title,
+                 'color': List.color.name.lower(),
+                 'labels': sorted(label.name for label in List.labels.all())}
+        old = self.lists.get(List.id)
+        if old is not None:
+            if all(old[key] == entry[key] for key in entry):
+                return
+            self._apply(old, -1)
+        entry['counts'] = list_counts(List)
+        self.lists[List.id] = entry
+        self._apply(entry, 1)
+
+    def remove_list(self, list_id):
+        old = self.lists.pop(list_id, None)
+        if old is not None:
+            self._apply(old, -1)
+
+    def update(self, lists, notes):
+        """
+        Brings the statistics up to date with the active lists and notes
+        """
+        alive = set()
+        for List in lists:
+            alive.add(List.id)
+            self.update_list(List)
+        for list_id in set(self.lists) - alive:
+            self.remove_list(list_id)
+        self.notes = len(notes)
+
+    @staticmethod
+    def ratio(checked, items):
+        return round(float(checked) / items, 3) if items else 0.0
+
+    def as_dict(self):
+        """ All the statistics as plain python types, ready for json"""
+        def group(counter):
+            return {'lists': counter['lists'], 'items': counter['items'],
+                    'checked': counter['checked'],
+                    'checked_ratio': self.ratio(counter['checked'], counter['items'])}
+        return {
+            'lists': len(self.lists),
+            'notes': self.notes,
+            'items': self.items,
+            'checked': self.checked,
+            'checked_ratio': self.ratio(self.checked, self.items),
+            'per_list': dict((entry['title'], {
+                'items': entry['counts']['items'],
+                'checked': entry['counts']['checked'],
+                'checked_ratio': self.ratio(entry['counts']['checked'], entry['counts']['items'])})
+                for entry in self.lists.values()),
+            'per_color': dict((k, group(v)) for k, v in self.by_color.items() if v['lists']),
+            'per_label': dict((k, group(v)) for k, v in self.by_label.items() if v['lists']),
+            'created_per_day': dict((k, v) for k, v in sorted(self.created.items()) if v),
+            'completed_per_day': dict((k, v) for k, v in sorted(self.completed.items()) if v),
+        }
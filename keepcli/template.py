@@ -0,0 +1,115 @@
+"""List templates: saved copies of lists that can be created again in a single sync"""
+import os
+import random
+import yaml
+import gkeepapi
+from keepcli.tree import ItemTree
+from keepcli.filelock import FileLock, replace_atomic
+
+TEMPLATE_FILE = 'templates.yaml'
+SORT_DELTA = 10000
+
+
+def capture(List):
+    """
+    Copy of a list as plain python types
+
+    Returns
+    -------
+    dict
+        title, color, pinned and items ({text, checked, depth}) in Keep's order
+    """
+    tree = ItemTree(List.items, keep_order=True)
+    return {'title': List.title,
+            'color': List.color.name,
+            'pinned': bool(List.pinned),
+            'items': [{'text': item.text, 'checked': bool(item.checked), 'depth': depth}
+                      for depth, item in tree.walk()]}
+
+
+def instantiate(keep, template, title=None):
+    """
+    Creates a list from a template with local calls only, nothing is sent until the next
+    sync. Items keep their order (decreasing sort values, as createList does) and
+    nesting.
+
+    Parameters
+    ----------
+    keep : gkeepapi.Keep
+        Client owning the new list
+    template : dict
+        As returned by capture
+    title : str, optional
+        Title of the new list, the template title by default
+
+    Returns
+    -------
+    gkeepapi.node.List
+        The new list
+    """
+    List = keep.createList(title or template['title'])
+    List.color = gkeepapi.node.ColorValue[template['color']]
+    List.pinned = template['pinned']
+    sort = random.randint(1000000000, 9999999999)
+    parents = []
+    for entry in template['items']:
+        item = List.add(entry['text'], entry['checked'], sort)
+        sort -= SORT_DELTA
+        depth = min(entry['depth'], len(parents))
+        del parents[depth:]
+        if parents:
+            parents[-1].indent(item)
+        parents.append(item)
+    return List
+
+
+class TemplateStore(object):
+    """
+    Templates saved in a yaml file, name -> list of captured lists. The file is read and
+    written under its lock so several keepcli processes can share it.
+
+    Parameters
+    ----------
+    path : str
+        The templates file, e.g. ~/.keepcli/templates.yaml
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r') as stream:
+            return yaml.safe_load(stream) or {}
+
+    def load(self):
+        with FileLock(self.path, shared=True):
+            return self._read()
+
+    def _modify(self, change):
+        with FileLock(self.path):
+            templates = self._read()
+            change(templates)
+            replace_atomic(self.path, yaml.safe_dump(
+                templates, default_flow_style=False).encode('utf-8'))
+        return templates
+
+    def save(self, name, List):
+        """
+        Adds a copy of a list to a template, replacing a list with the same title
+        """
+        captured = capture(List)
+
+        def change(templates):
+            lists = [t for t in templates.get(name, []) if t['title'] != captured['title']]
+            templates[name] = lists + [captured]
+        return self._modify(change)[name]
+
+    def remove(self, name):
+        """ Deletes a template, returns False if there was none"""
+        found = []
+
+        def change(templates):
+            found.append(templates.pop(name, None))
+        self._modify(change)
+        return found[0] is not None
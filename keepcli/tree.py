@@ -0,0 +1,149 @@
+"""Parent/child hierarchy of list items (sub-items), cached per list version"""
+import bisect
+
+
+def node_version(node):
+    """
+    Cheap fingerprint of an entry and its children, it changes whenever an item is added,
+    deleted (even before the deletion is synced) or touched (checked, edited, indented or
+    dedented) or the note text changes
+
+    Parameters
+    ----------
+    node : gkeepapi.node.TopLevelNode
+        A list or a note
+
+    Returns
+    -------
+    str
+        Number of live and checked children, latest child update or deletion and
+        entry update
+    """
+    live = checked = 0
+    stamps = []
+    for child in node.children:
+        if child.deleted:
+            stamps.append(child.timestamps.deleted)
+            continue
+        live += 1
+        checked += 1 if getattr(child, 'checked', False) else 0
+        stamps.append(child.timestamps.updated)
+    latest = max(stamps).isoformat() if stamps else ''
+    return '{}|{}|{}|{}'.format(live, checked, latest, node.timestamps.updated.isoformat())
+
+
+class ItemTree(object):
+    """
+    Hierarchy of the items of a list. Children are grouped under their parent id in a
+    single pass and every level is sorted by creation time, or by Keep's own order.
+    Flattened display views are computed on first use and kept with the tree.
+
+    Parameters
+    ----------
+    items : list of gkeepapi.node.ListItem
+        All the items of a list, including sub-items
+    keep_order : bool, optional
+        If True sort as Keep does (highest sort value first) instead of by creation time
+    """
+    def __init__(self, items, keep_order=False):
+        by_id = dict((item.id, item) for item in items)
+        self.children = {}
+        self.roots = []
+        self.total = len(items)
+        self.unchecked = 0
+        self.views = {}
+        self.by_update = {}
+        for item in items:
+            if not item.checked:
+                self.unchecked += 1
+            parent_id = item.super_list_item_id
+            if parent_id and parent_id in by_id:
+                self.children.setdefault(parent_id, []).append(item)
+            else:
+                self.roots.append(item)
+        if keep_order:
+            key = lambda item: -int(item.sort)
+        else:
+            key = lambda item: item.timestamps.created
+        self.roots.sort(key=key)
+        for group in self.children.values():
+            group.sort(key=key)
+
+    def walk(self, roots=None, depth=0):
+        """
+        Yields (depth, item) for every item below roots in depth first order
+
+        Parameters
+        ----------
+        roots : list of gkeepapi.node.ListItem, optional
+            Where to start, all the top level items by default
+        """
+        for item in self.roots if roots is None else roots:
+            yield depth, item
+            for entry in self.walk(self.children.get(item.id, []), depth + 1):
+                yield entry
+
+    def rows(self, only_unchecked=False):
+        """
+        Display order of the list, unchecked items first then checked ones, each with
+        its sub-items
+
+        Returns
+        -------
+        list of tuple
+            (depth, item), computed once per tree
+        """
+        if only_unchecked not in self.views:
+            roots = [i for i in self.roots if not i.checked]
+            if not only_unchecked:
+                roots += [i for i in self.roots if i.checked]
+            self.views[only_unchecked] = [(depth, i) for depth, i in self.walk(roots)
+                                          if not (only_unchecked and i.checked)]
+        return self.views[only_unchecked]
+
+    def rows_since(self, since, only_unchecked=False):
+        """
+        Rows of items updated on or after a date, in display order. The rows are kept
+        sorted by update day so only the matching ones are visited.
+
+        Parameters
+        ----------
+        since : datetime.date
+            First day to include
+        """
+        rows = self.rows(only_unchecked)
+        if only_unchecked not in self.by_update:
+            self.by_update[only_unchecked] = sorted(
+                (item.timestamps.updated.date(), position)
+                for position, (_, item) in enumerate(rows))
+        by_update = self.by_update[only_unchecked]
+        start = bisect.bisect_left(by_update, (since,))
+        return [rows[position] for position in sorted(p for _, p in by_update[start:])]
+
+
+class TreeCache(object):
+    """
+    Keeps one ItemTree per list and rebuilds it only when the list version changes
+    """
+    def __init__(self):
+        self.trees = {}
+
+    def get(self, List):
+        """
+        Returns the cached ItemTree for a list, building it if the list changed
+        """
+        version = node_version(List)
+        cached = self.trees.get(List.id)
+        if cached is None or cached[0] != version:
+            cached = (version, ItemTree(List.items))
+            self.trees[List.id] = cached
+        return cached[1]
+
+    def invalidate(self, List=None):
+        """
+        Drops the cached tree of a list, or all of them
+        """
+        if List is None:
+            self.trees.clear()
+        else:
+            self.trees.pop(List.id, None)
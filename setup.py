@@ -39,6 +39,7 @@ setup(
     author_email='mgckind@gmail.com',
     scripts=['bin/keepcli'],
     packages=pkgs,
+    package_data={'keepcli': ['keepcli-completion.bash']},
     license='LICENSE.txt',
     description='Simple unofficial Google Keep Interactive Command Line Interpreter',
     long_description=long_description,
@@ -0,0 +1,37 @@
+import os
+import pickle
+import gkeepapi
+import pytest
+from keepcli import keep
+from keepcli.filelock import write_locked, write_yaml
+
+USER = 'me@example.com'
+
+
+@pytest.fixture
+def kcli_home(tmp_path, monkeypatch):
+    """ A throwaway HOME with a default keepcli config, returns the .keepcli directory"""
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setattr(os, 'system', lambda command: 0)
+    for name in ('KEEPCLI_REPLAY', 'KEEPCLI_RECORD', 'KEEPCLI_METRICS', 'KEEPCLI_AUTH'):
+        monkeypatch.delenv(name, raising=False)
+    kcli_path = tmp_path / '.keepcli'
+    kcli_path.mkdir()
+    keep.write_conf(str(kcli_path / 'config.yaml'))
+    return kcli_path
+
+
+@pytest.fixture
+def offline_gkeep(kcli_home):
+    """
+    An offline GKeep loaded from a snapshot with the list Groceries and the note Ideas
+    """
+    account = gkeepapi.Keep()
+    account.createList('Groceries', [('milk', False), ('eggs', True)])
+    account.createNote('Ideas', 'first idea')
+    write_yaml(str(kcli_home / 'auth.yaml'), {'user': USER, 'passwd': 'secret'})
+    write_locked(str(kcli_home / (USER + '.kci')), pickle.dumps(account))
+    gkeep = keep.GKeep(auth_file=str(kcli_home / 'auth.yaml'),
+                       conf_file=str(kcli_home / 'config.yaml'), offline=True)
+    yield gkeep
+    gkeep.do_exit(None)
@@ -0,0 +1,33 @@
+import datetime
+
+
+def agenda(gkeep):
+    return [(due, node.title if parent is None else node.text)
+            for due, node, parent in gkeep.agenda.until()]
+
+
+def test_remind_does_not_change_keep_content(offline_gkeep):
+    today = datetime.date.today()
+    tomorrow = today + datetime.timedelta(days=1)
+    offline_gkeep.onecmd('useList Groceries')
+    offline_gkeep.onecmd('remind --on today')
+    offline_gkeep.onecmd('remind milk --on tomorrow')
+    groceries = offline_gkeep.current
+    assert groceries.title == 'Groceries'
+    assert [item.text for item in groceries.items] == ['milk', 'eggs']
+    assert agenda(offline_gkeep) == [(today, 'Groceries'), (tomorrow, 'milk')]
+    offline_gkeep.onecmd('addItem bread --under milk')
+    assert [item.text for item in groceries.items] == ['milk', 'bread', 'eggs']
+
+
+def test_due_dates_survive_a_refresh_and_can_be_cleared(offline_gkeep):
+    offline_gkeep.onecmd('useList Groceries')
+    offline_gkeep.onecmd('remind milk --on 2030-01-02')
+    offline_gkeep.onecmd('refresh')
+    assert agenda(offline_gkeep) == [(datetime.date(2030, 1, 2), 'milk')]
+    offline_gkeep.onecmd('checkItem milk')
+    assert agenda(offline_gkeep) == []
+    offline_gkeep.onecmd('uncheckItem milk')
+    assert agenda(offline_gkeep) == [(datetime.date(2030, 1, 2), 'milk')]
+    offline_gkeep.onecmd('remind milk --clear')
+    assert agenda(offline_gkeep) == []
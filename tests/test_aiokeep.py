@@ -0,0 +1,52 @@
+import io
+import os
+import time
+import signal
+import threading
+import pytest
+from keepcli.aiokeep import CANCELLED, FINISHED, AsyncKeep, Cancelled
+from keepcli.netstats import NetStats, PooledSession
+
+
+def interrupt(after):
+    """ Sends SIGINT to this process after some seconds, like a Ctrl-C"""
+    timer = threading.Timer(after, os.kill, (os.getpid(), signal.SIGINT))
+    timer.start()
+    return timer
+
+
+def test_ctrl_c_stops_a_sync_at_its_next_request():
+    aio = AsyncKeep(None)
+    requests_sent = []
+
+    def sync():
+        for page in range(30):
+            aio.check_cancelled()
+            requests_sent.append(page)
+            time.sleep(0.1)
+    start = time.time()
+    interrupt(0.3)
+    with pytest.raises(KeyboardInterrupt):
+        aio.run(aio.exclusive(sync), 'Syncing...', io.StringIO())
+    assert time.time() - start < 1.5
+    assert aio.interrupted == CANCELLED
+    assert len(requests_sent) < 30
+    aio.close()
+
+
+def test_ctrl_c_reports_a_call_that_finished_anyway():
+    aio = AsyncKeep(None)
+    interrupt(0.2)
+    with pytest.raises(KeyboardInterrupt):
+        aio.run(aio.exclusive(time.sleep, 1), 'Dumping...', io.StringIO())
+    assert aio.interrupted == FINISHED
+    assert not aio.running
+    aio.close()
+
+
+def test_pooled_session_checks_before_every_request():
+    def check():
+        raise Cancelled('Interrupted')
+    session = PooledSession(NetStats(), check=check)
+    with pytest.raises(Cancelled):
+        session.request('GET', 'http://127.0.0.1:9/')
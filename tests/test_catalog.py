@@ -0,0 +1,20 @@
+import os
+import shutil
+import subprocess
+import pytest
+from keepcli.catalog import CATALOG_FILE
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      'keepcli', 'keepcli-completion.bash')
+
+
+@pytest.mark.skipif(shutil.which('bash') is None, reason='needs bash')
+def test_completion_finds_the_items_of_the_current_list(offline_gkeep, kcli_home):
+    offline_gkeep.keep.createList('Week\t plan', [('gym', False), ('read', True)])
+    offline_gkeep.onecmd('refresh')
+    offline_gkeep.onecmd('useList Week\t plan')
+    assert 'current\t\tWeek plan\n' in (kcli_home / CATALOG_FILE).read_text()
+    items = subprocess.check_output(
+        ['bash', '-c', 'source "$0" && _keepcli_catalog item "$(_keepcli_current)"', SCRIPT],
+        env=dict(os.environ, KEEPCLI_HOME=str(kcli_home)), universal_newlines=True)
+    assert items == 'gym\n'
@@ -0,0 +1,20 @@
+import gkeepapi
+import pytest
+from keepcli.checkpoint import Checkpointer
+
+
+def test_refresh_without_changes_leaves_the_snapshot_clean(offline_gkeep):
+    assert not offline_gkeep.checkpoint.dirty
+    offline_gkeep.onecmd('refresh')
+    assert not offline_gkeep.checkpoint.dirty
+    offline_gkeep.onecmd('useList Groceries')
+    offline_gkeep.onecmd('addItem bread')
+    assert offline_gkeep.checkpoint.dirty
+
+
+def test_failed_write_keeps_the_snapshot_dirty(tmp_path):
+    checkpoint = Checkpointer(gkeepapi.Keep, lambda: str(tmp_path / 'missing' / 'me.kci'))
+    checkpoint.touch()
+    with pytest.raises(IOError):
+        checkpoint.write()
+    assert checkpoint.dirty
@@ -0,0 +1,18 @@
+from keepcli.media import MediaCache
+
+
+def test_media_index_keeps_objects_cached_by_another_process(tmp_path):
+    first = MediaCache(str(tmp_path))
+    second = MediaCache(str(tmp_path))
+    first.put('blob-1', b'one', 'image/png')
+    first.save()
+    second.put('blob-2', b'two', 'image/png')
+    second.save()
+    cache = MediaCache(str(tmp_path))
+    assert open(cache.get('blob-1'), 'rb').read() == b'one'
+    assert open(cache.get('blob-2'), 'rb').read() == b'two'
+    first.clear()
+    first.save()
+    cache = MediaCache(str(tmp_path))
+    assert cache.get('blob-1') is None
+    assert open(cache.get('blob-2'), 'rb').read() == b'two'
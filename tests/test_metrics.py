@@ -0,0 +1,16 @@
+import gkeepapi
+
+
+def pending_writes(gkeep):
+    return list(gkeep.metrics.values['keepcli_pending_writes'].values())
+
+
+def test_pending_writes_are_counted_on_refresh_only(offline_gkeep, monkeypatch):
+    offline_gkeep.set_metrics(True)
+    offline_gkeep.onecmd('refresh')
+    assert pending_writes(offline_gkeep) == [2]
+    walks = []
+    all_entries = gkeepapi.Keep.all
+    monkeypatch.setattr(gkeepapi.Keep, 'all', lambda keep: walks.append(1) or all_entries(keep))
+    offline_gkeep.onecmd('whoami')
+    assert walks == []
@@ -0,0 +1,35 @@
+from keepcli.mirror import Mirror
+
+
+def mirror_existing(gkeep, tmp_path, content):
+    gkeep.onecmd('mirror dir {}'.format(tmp_path))
+    (tmp_path / 'groceries.txt').write_text(content)
+    gkeep.onecmd('mirror add Groceries --file groceries.txt')
+    gkeep.onecmd('mirror')
+
+
+def test_mirror_keeps_an_existing_file(offline_gkeep, tmp_path):
+    mirror_existing(offline_gkeep, tmp_path, 'my own notes\n')
+    assert (tmp_path / 'groceries.txt.conflict').read_text() == 'my own notes\n'
+    assert (tmp_path / 'groceries.txt').read_text() == 'milk\nx eggs\n'
+
+
+def test_mirror_adopts_an_existing_file_with_the_same_content(offline_gkeep, tmp_path):
+    mirror_existing(offline_gkeep, tmp_path, 'milk\nx eggs\n')
+    assert not (tmp_path / 'groceries.txt.conflict').exists()
+    assert (tmp_path / 'groceries.txt').read_text() == 'milk\nx eggs\n'
+
+
+def test_mirror_state_keeps_entries_saved_by_another_process(offline_gkeep, tmp_path):
+    groceries, ideas = sorted(offline_gkeep.entries, key=lambda n: n.title)
+    state_file = str(tmp_path / 'mirror.yaml')
+    first = Mirror(state_file, str(tmp_path))
+    second = Mirror(state_file, str(tmp_path))
+    first.add(groceries)
+    first.save()
+    second.add(ideas)
+    second.save()
+    assert set(Mirror(state_file, str(tmp_path)).entries) == {groceries.id, ideas.id}
+    first.remove(groceries.id)
+    first.save()
+    assert set(Mirror(state_file, str(tmp_path)).entries) == {ideas.id}
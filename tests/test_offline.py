@@ -0,0 +1,6 @@
+from conftest import USER
+
+
+def test_offline_start_from_snapshot(offline_gkeep):
+    assert offline_gkeep.username == USER
+    assert sorted(n.title for n in offline_gkeep.entries) == ['Groceries', 'Ideas']
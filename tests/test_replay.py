@@ -0,0 +1,50 @@
+import os
+import socket
+import getpass
+import builtins
+import pytest
+from keepcli import keep
+
+CASSETTE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'session.json')
+
+
+def refuse(*args, **kwargs):
+    raise AssertionError('a replayed session must not use the network or credentials')
+
+
+@pytest.fixture
+def replayed(kcli_home, monkeypatch):
+    """ GKeep replaying tests/data/session.json, with the network and prompts refused"""
+    monkeypatch.setenv('KEEPCLI_REPLAY', CASSETTE)
+    monkeypatch.setenv('KEEPCLI_REPLAY_LATENCY', '0')
+    monkeypatch.setattr(socket.socket, 'connect', refuse)
+    monkeypatch.setattr(builtins, 'input', refuse)
+    monkeypatch.setattr(getpass, 'getpass', refuse)
+    gkeep = keep.GKeep(auth_file=str(kcli_home / 'auth.yaml'),
+                       conf_file=str(kcli_home / 'config.yaml'))
+    yield gkeep
+    gkeep.do_exit(None)
+
+
+def test_replayed_session_starts_without_credentials(replayed, kcli_home):
+    assert replayed.username == 'replay@example.com'
+    assert not (kcli_home / 'auth.yaml').exists()
+    assert sorted(n.title for n in replayed.entries) == [
+        'Books', 'Chores', 'Groceries', 'Ideas', 'Packing']
+    assert sorted(replayed.lists) == ['Books', 'Chores', 'Groceries']
+    assert sorted(replayed.notes) == ['Ideas', 'Packing']
+
+
+def test_replayed_session_edits_dumps_and_loads(replayed, kcli_home):
+    replayed.onecmd('refresh')
+    replayed.onecmd('create list Replay')
+    replayed.onecmd('useList Replay')
+    for i in range(10):
+        replayed.onecmd('addItem item {}'.format(i))
+    replayed.onecmd('checkItem item 0')
+    replayed.onecmd('dump')
+    assert (kcli_home / 'replay@example.com.kci').exists()
+    replayed.onecmd('load')
+    List = [n for n in replayed.entries if n.title == 'Replay'][0]
+    assert len(List.items) == 10
+    assert [item.text for item in List.checked] == ['item 0']
@@ -0,0 +1,29 @@
+import time
+import threading
+from keepcli.scheduler import SyncScheduler
+
+
+def test_run_reuses_a_sync_that_finished_while_waiting():
+    syncs = []
+
+    def sync():
+        syncs.append(1)
+        time.sleep(0.3)
+        return True
+    scheduler = SyncScheduler(sync, lambda: False)
+    results = []
+    first = threading.Thread(target=lambda: results.append(scheduler.run()))
+    first.start()
+    time.sleep(0.1)
+    results.append(scheduler.run())
+    first.join()
+    assert results == [True, True]
+    assert len(syncs) == 1
+
+
+def test_run_syncs_again_when_changes_are_pending():
+    syncs = []
+    scheduler = SyncScheduler(lambda: syncs.append(1) or False, lambda: True)
+    scheduler.run()
+    scheduler.run()
+    assert len(syncs) == 2